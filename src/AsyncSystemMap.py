@@ -0,0 +1,60 @@
+import asyncio
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, BinaryIO, Iterable, Iterator, Type
+
+import SystemMap
+
+class AsyncSystemMap:
+    """
+    asyncio facade over a `SystemMap` (or `ElectronicSystemMap`).  Every call runs on a dedicated thread pool, so
+    the event loop never blocks on SQLite or JSON parsing.  Queries only run side by side if the map has a read
+    pool (`SystemMap.EnableReadPool()`); otherwise they share the map's single connection.
+    """
+
+    map: SystemMap.SystemMap
+
+    def __init__(self, systemMap: SystemMap.SystemMap, maxWorkers: int = 4):
+        self.map = systemMap
+        self._executor = ThreadPoolExecutor(maxWorkers, thread_name_prefix='AsyncSystemMap')
+
+    async def __aenter__(self) -> 'AsyncSystemMap':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.Close()
+
+    async def Query(self, q: str, values: tuple | None = None) -> list[tuple]:
+        return await self._Run(self.map.Query, q, values)
+
+    async def QueryColumns(self, q: str, values: tuple | None = None, arraysize: int = 1000) -> dict[str, any]:
+        return await self._Run(self.map.QueryColumns, q, values, arraysize)
+
+    async def QueryIter(self, q: str, values: tuple | None = None, arraysize: int = 1000) -> AsyncIterator[tuple]:
+        """Yields rows as `SystemMap.QueryIter()` fetches them, one `arraysize` batch per trip to the thread pool."""
+        rows = self.map.QueryIter(q, values, arraysize)
+        try:
+            while batch := await self._Run(_NextBatch, rows, arraysize):
+                for row in batch:
+                    yield row
+        finally:
+            await self._Run(rows.close)
+
+    async def LoadFromJson(self, jsonStr: str, supportedObjects: Iterable[Type[SystemMap.MapObject]], eraseExisting: bool,
+                           workers: int | None = None) -> list[str]:
+        return await self._Run(self.map.LoadFromJson, jsonStr, supportedObjects, eraseExisting, workers)
+
+    async def LoadFromJsonFile(self, jsonFile: str | os.PathLike | BinaryIO, supportedObjects: Iterable[Type[SystemMap.MapObject]],
+                               eraseExisting: bool, workers: int | None = None) -> list[str]:
+        return await self._Run(self.map.LoadFromJsonFile, jsonFile, supportedObjects, eraseExisting, workers)
+
+    async def Close(self) -> None:
+        """Waits for running calls to finish and shuts the thread pool down (the map itself stays open)."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def _Run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+def _NextBatch(rows: Iterator[tuple], n: int) -> list[tuple]:
+    return list(itertools.islice(rows, n))
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import get_type_hints
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+import AsyncSystemMap
+import DiagramGenerator
+import ElectronicSystems
+import SystemMap
+
+SUPPORTED_OBJECTS = [ElectronicSystems.ENode, ElectronicSystems.Bus, ElectronicSystems.Connection, ElectronicSystems.Net, ElectronicSystems.PinMap]
+
+def BenchHydration(nNodes: int = 2000) -> float:
+    """Returns `MapObject`s constructed per second when hydrating a synthetic diagram."""
+    diagram = DiagramGenerator.GenerateDiagram(nNodes)
+    start = time.perf_counter()
+    count = 0
+    for key, objType in (('busses', ElectronicSystems.Bus), ('nodes', ElectronicSystems.ENode)):
+        for jo in diagram[key]:
+            o = objType(jo, SUPPORTED_OBJECTS)
+            count += 1
+            for c in getattr(o, 'connections', None) or getattr(o, 'nets', None) or []:
+                count += 1 + len(getattr(c, 'pinout', []))
+    return count / (time.perf_counter() - start)
+
+def BenchValidation(nNodes: int = 2000) -> dict[str, float]:
+    """
+    Returns objects validated per second by the validators `MapObject` compiles from each class's type hints and,
+    if typeguard is installed, by calling its `check_type()` on every field instead.
+    """
+    nodes = [ElectronicSystems.ENode(jo, SUPPORTED_OBJECTS) for jo in DiagramGenerator.GenerateDiagram(nNodes)['nodes']]
+    objects = nodes + [c for n in nodes for c in n.connections] + [p for n in nodes for c in n.connections for p in c.pinout]
+    plans = {t: t._Plan(SUPPORTED_OBJECTS) for t in SUPPORTED_OBJECTS}
+    start = time.perf_counter()
+    for o in objects:
+        plans[type(o)].valid(o)
+    rates = {'compiled': len(objects) / (time.perf_counter() - start)}
+    try:
+        from typeguard import check_type
+    except ImportError:
+        return rates
+    baseProps = SystemMap.MapObject.__annotations__.keys()
+    hints = {t: [(p, h) for p, h in get_type_hints(t).items() if p not in baseProps] for t in SUPPORTED_OBJECTS}
+    start = time.perf_counter()
+    for o in objects:
+        for prop, hint in hints[type(o)]:
+            check_type(getattr(o, prop), hint)
+    rates['typeguard'] = len(objects) / (time.perf_counter() - start)
+    return rates
+
+def BenchObjectMemory(nNodes: int = 2000) -> float:
+    """Returns bytes allocated per hydrated `MapObject` (with its `extraJson` and member lists), measured with tracemalloc."""
+    diagram = DiagramGenerator.GenerateDiagram(nNodes)
+    ElectronicSystems.ENode(diagram['nodes'][0], SUPPORTED_OBJECTS) # so the hydration plans aren't counted
+    tracemalloc.start()
+    nodes = [ElectronicSystems.ENode(jo, SUPPORTED_OBJECTS) for jo in diagram['nodes']]
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    count = sum(1 + len(c.pinout) for n in nodes for c in n.connections) + len(nodes)
+    return allocated / count
+
+def BenchParallelImport(nNodes: int = 3000, workers: int = 4) -> dict[str, float]:
+    """Returns rows imported per second by `LoadFromJson()` in this process and with `workers` hydration processes."""
+    jsonStr = json.dumps(DiagramGenerator.GenerateDiagram(nNodes))
+    rates = {}
+    for label, nWorkers in (('serial', None), ('parallel', workers)):
+        with tempfile.TemporaryDirectory() as dataDir:
+            systemMap = ElectronicSystems.ElectronicSystemMap('bench', dataDir, json.dumps(DiagramGenerator.GenerateDiagram(1)))
+            start = time.perf_counter()
+            systemMap.LoadFromJson(jsonStr, SUPPORTED_OBJECTS, True, nWorkers)
+            elapsed = time.perf_counter() - start
+            rates[label] = systemMap.Query('SELECT (SELECT count(*) FROM nodes) + (SELECT count(*) FROM connections) + (SELECT count(*) FROM pinouts)')[0][0] / elapsed
+            del systemMap
+    return rates
+
+def BenchConnectivity(nNodes: int = 25000, connectionsPerNode: int = 4) -> dict[str, float]:
+    """
+    Returns the seconds taken to build a `ConnectivityGraph` and the microseconds per neighbour, wiring,
+    reachability and shortest-path query, on a diagram with as many (small) busses as nodes.
+    """
+    with tempfile.TemporaryDirectory() as dataDir:
+        diagram = DiagramGenerator.GenerateDiagram(nNodes, nBusses=nNodes, connectionsPerNode=connectionsPerNode)
+        systemMap = ElectronicSystems.ElectronicSystemMap('bench', dataDir, json.dumps(diagram))
+        start = time.perf_counter()
+        graph = systemMap.Connectivity()
+        timings = {'build': time.perf_counter() - start}
+        del systemMap
+    pairs = [(f'Node {i}', f'Node {(i * 7919) % nNodes}') for i in range(200)]
+    for label, query in (('neighbours', lambda a, b: graph.Neighbours(a)), ('wiring', graph.Wiring),
+                         ('reachable', graph.IsReachable), ('shortestPath', graph.ShortestPath)):
+        start = time.perf_counter()
+        for a, b in pairs:
+            query(a, b)
+        timings[label] = (time.perf_counter() - start) / len(pairs) * 1e6
+    return timings
+
+def BenchAsyncQueries(nNodes: int = 2000, concurrency: int = 4, requests: int = 400) -> dict[str, float]:
+    """Returns queries per second for sequential `Query()` calls and for `concurrency` in-flight async requests."""
+    q = ('SELECT n.name, count(p.rowid) FROM nodes n JOIN connections c ON c.node = n.rowid '
+         'JOIN pinouts p ON p.connection = c.rowid WHERE n.name = ? GROUP BY n.rowid')
+    names = [(f'Node {i % nNodes}',) for i in range(requests)]
+    with tempfile.TemporaryDirectory() as dataDir:
+        systemMap = ElectronicSystems.ElectronicSystemMap('bench', dataDir, json.dumps(DiagramGenerator.GenerateDiagram(nNodes)))
+        systemMap.EnableReadPool(concurrency)
+
+        start = time.perf_counter()
+        for values in names:
+            systemMap.Query(q, values)
+        sequential = requests / (time.perf_counter() - start)
+
+        async def Run() -> float:
+            async with AsyncSystemMap.AsyncSystemMap(systemMap, concurrency) as asyncMap:
+                start = time.perf_counter()
+                await asyncio.gather(*(asyncMap.Query(q, values) for values in names))
+                return requests / (time.perf_counter() - start)
+
+        concurrent = asyncio.run(Run())
+        del systemMap
+    return {'sequential': sequential, 'concurrent': concurrent}
+
+# representative joins for `RunSuite()`: name -> (query, what its parameters are drawn from, runs per sample size)
+SUITE_QUERIES = {
+    'nodeConnections': ('SELECT c.name, b.name, c.connector FROM connections c JOIN nodes n ON n.rowid = c.node '
+                        'JOIN busses b ON b.rowid = c.bus WHERE n.name = ?', 'node', 200),
+    'busNodes': ('SELECT DISTINCT n.name FROM busses b JOIN connections c ON c.bus = b.rowid JOIN nodes n ON n.rowid = c.node '
+                 'WHERE b.name = ?', 'bus', 50),
+    'netFanout': ('SELECT n.name, c.name, p.pin FROM busses b JOIN nets t ON t.bus = b.rowid JOIN pinouts p ON p.net = t.rowid '
+                  'JOIN connections c ON c.rowid = p.connection JOIN nodes n ON n.rowid = c.node WHERE b.name = ? AND t.name = ?', 'net', 50),
+    'pinsPerNode': ('SELECT n.name, count(*) FROM nodes n JOIN connections c ON c.node = n.rowid '
+                    'JOIN pinouts p ON p.connection = c.rowid GROUP BY n.rowid', None, 3),
+}
+SUITE_PINS = (1_000, 10_000, 100_000, 1_000_000)
+
+def RunSuite(outFile: str, pinCounts: tuple[int, ...] = SUITE_PINS, **layout) -> dict[str, any]:
+    """
+    Imports a generated diagram of each size in `pinCounts` into a fresh `ElectronicSystemMap`, measuring import
+    time, peak RSS, database size and the latency of each of `SUITE_QUERIES`, and writes the results (with the
+    versions they were measured on) to `outFile` as JSON.  `layout` goes to `DiagramGenerator.GenerateDiagram()`.
+    Each size is imported in a newly spawned process so its peak RSS isn't inflated by the previous ones.
+    """
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for nPins in pinCounts:
+        with tempfile.TemporaryDirectory() as dataDir:
+            nodes = DiagramGenerator.NodesForPins(nPins, layout.get('netsPerBus', 8), layout.get('connectionsPerNode', 4),
+                                                  layout.get('pinoutDensity', 1.0))
+            jsonPath = os.path.join(dataDir, 'diagram.json')
+            with open(jsonPath, 'w') as f:
+                json.dump(DiagramGenerator.GenerateDiagram(nodes, **layout), f)
+            with context.Pool(1) as pool:
+                result = pool.apply(_SuiteRun, (jsonPath, dataDir))
+        results.append({'pins': nPins, 'nodes': nodes, **result})
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'layout': layout,
+        'results': results,
+    }
+    with open(outFile, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def _SuiteRun(jsonPath: str, dataDir: str) -> dict[str, any]:
+    start = time.perf_counter()
+    systemMap = ElectronicSystems.ElectronicSystemMap('bench', dataDir, jsonFile=jsonPath)
+    result = {'importSeconds': time.perf_counter() - start, 'peakRssBytes': _PeakRss(), 'jsonBytes': os.path.getsize(jsonPath)}
+    result['pinouts'] = systemMap.Query('SELECT count(*) FROM pinouts')[0][0]
+    dbPath = os.path.join(dataDir, 'bench.db')
+    result['dbBytes'] = sum(os.path.getsize(p) for p in (dbPath, dbPath + '-wal') if os.path.exists(p))
+
+    rng = random.Random(0)
+    params = {
+        'node': systemMap.Query('SELECT name FROM nodes'),
+        'bus': systemMap.Query('SELECT name FROM busses'),
+        'net': systemMap.Query('SELECT b.name, t.name FROM nets t JOIN busses b ON b.rowid = t.bus'),
+        None: [None],
+    }
+    latencies = {}
+    for name, (q, source, runs) in SUITE_QUERIES.items():
+        samples = []
+        for _ in range(runs):
+            values = rng.choice(params[source])
+            start = time.perf_counter()
+            systemMap.Query(q, values)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        latencies[name] = {'medianMs': statistics.median(samples), 'p95Ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                           'runs': runs}
+    result['queries'] = latencies
+
+    systemMap.EnableReadPool(len(ElectronicSystems.DesignRules.RULES))
+    report = systemMap.CheckDesignRules()
+    result['designRules'] = {'seconds': report.seconds, **{r.rule.name: {'seconds': r.seconds, 'violations': len(r.rows)} for r in report.results}}
+    systemMap.DisableReadPool()
+    return result
+
+def _PeakRss() -> int | None:
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024 # kilobytes everywhere else
+
+def _Micro() -> None:
+    print(f'hydration: {BenchHydration():.0f} objects/s')
+    rates = BenchValidation()
+    print(f'validation: {rates["compiled"]:.0f} objects/s compiled' + (f', {rates["typeguard"]:.0f} objects/s with typeguard' if 'typeguard' in rates else ''))
+    print(f'memory: {BenchObjectMemory():.0f} bytes/object')
+    rates = BenchParallelImport()
+    print(f'import: {rates["serial"]:.0f} rows/s serial, {rates["parallel"]:.0f} rows/s with 4 workers')
+    timings = BenchConnectivity()
+    print(f'connectivity: built in {timings.pop("build"):.2f} s, ' + ', '.join(f'{query} {us:.1f} us' for query, us in timings.items()))
+    rates = BenchAsyncQueries()
+    print(f'queries: {rates["sequential"]:.0f}/s sequential, {rates["concurrent"]:.0f}/s async')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the micro benchmarks, or with --suite the import/query scaling suite.')
+    parser.add_argument('--suite', metavar='OUT_FILE', help='write scaling suite results to this JSON file')
+    parser.add_argument('--pins', type=int, nargs='+', default=list(SUITE_PINS), help='pinout counts to run the suite at')
+    parser.add_argument('--extra-fields', type=int, default=0)
+    args = parser.parse_args()
+    if args.suite is None:
+        _Micro()
+    else:
+        report = RunSuite(args.suite, tuple(args.pins), extraFields=args.extra_fields)
+        for r in report['results']:
+            print(f'{r["pins"]:>9} pins: imported in {r["importSeconds"]:.2f} s, peak RSS {r["peakRssBytes"] / 2**20:.0f} MiB, '
+                  f'db {r["dbBytes"] / 2**20:.1f} MiB, ' + ', '.join(f'{q} {l["medianMs"]:.2f} ms' for q, l in r['queries'].items()) +
+                  f', design rules {r["designRules"]["seconds"]:.2f} s')
@@ -0,0 +1,284 @@
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import SystemMap
+
+class ConnectivityGraph:
+    """
+    Which nodes of an `ElectronicSystemMap` are wired to which, read from its tables once into CSR arrays.  Nodes
+    are wired together through the busses their connections are on, so the graph is kept bipartite (node -> its
+    connections -> their busses -> the connections on each bus) instead of as node-to-node edges, which would grow
+    with the square of each bus's size.  Connected components are labelled up front, so reachability is a lookup.
+
+    Nodes and busses are referred to by name.  The graph reflects the map as of when it was built; `changes` is the
+    map's `total_changes` at that point, which `ElectronicSystemMap.Connectivity()` uses to rebuild it.
+    """
+
+    changes: int
+    nodeNames: list[str]
+    busNames: list[str]
+
+    def __init__(self, systemMap: SystemMap.SystemMap):
+        self.changes = systemMap._db.total_changes
+        nodeIds: dict[int, int] = {}
+        self.nodeNames = []
+        for rowid, name in systemMap.QueryIter('SELECT rowid, name FROM nodes ORDER BY rowid'):
+            nodeIds[rowid] = len(self.nodeNames)
+            self.nodeNames.append(name)
+        self._nodeIndex = {name: i for i, name in enumerate(self.nodeNames)}
+        busIds: dict[int, int] = {}
+        self.busNames = []
+        for rowid, name in systemMap.QueryIter('SELECT rowid, name FROM busses ORDER BY rowid'):
+            busIds[rowid] = len(self.busNames)
+            self.busNames.append(name)
+        netNames = dict(systemMap.QueryIter('SELECT rowid, name FROM nets'))
+
+        # connections grouped by node: node i's are connNode/connBus/...[nodePtr[i]:nodePtr[i + 1]]
+        connIds: dict[int, int] = {}
+        self._connNames: list[str | None] = []
+        self._connNode = array.array('q')
+        self._connBus = array.array('q')
+        for rowid, node, bus, name in systemMap.QueryIter('SELECT rowid, node, bus, name FROM connections WHERE bus IS NOT NULL ORDER BY node, rowid'):
+            connIds[rowid] = len(self._connNames)
+            self._connNames.append(name)
+            self._connNode.append(nodeIds[node])
+            self._connBus.append(busIds[bus])
+        self._nodePtr = _Offsets(self._connNode, len(self.nodeNames))
+
+        # the same connections grouped by bus
+        self._busConns = array.array('q', sorted(range(len(self._connBus)), key=self._connBus.__getitem__))
+        self._busPtr = _Offsets(self._connBus, len(self.busNames))
+
+        # pinouts grouped by connection: (pin, net name) pairs
+        self._pinConn = array.array('q')
+        self._pins: list[tuple[str, str]] = []
+        for connection, pin, net in systemMap.QueryIter('SELECT connection, pin, net FROM pinouts ORDER BY connection, rowid'):
+            if connection in connIds:
+                self._pinConn.append(connIds[connection])
+                self._pins.append((pin, netNames[net]))
+        order = sorted(range(len(self._pins)), key=self._pinConn.__getitem__) # stable, so pinout order is kept
+        self._pins = [self._pins[i] for i in order]
+        self._connPinPtr = _Offsets(array.array('q', (self._pinConn[i] for i in order)), len(self._connNames))
+        del self._pinConn
+
+        self._component = self._LabelComponents()
+
+    def Neighbours(self, node: str) -> list[tuple[str, str]]:
+        """Returns `(neighbour, bus)` for every other node `node` shares a bus with, once per bus."""
+        i = self._Node(node)
+        seen: set[tuple[int, int]] = set()
+        neighbours = []
+        for c in range(self._nodePtr[i], self._nodePtr[i + 1]):
+            bus = self._connBus[c]
+            for other in self._busConns[self._busPtr[bus]:self._busPtr[bus + 1]]:
+                j = self._connNode[other]
+                if j != i and (j, bus) not in seen:
+                    seen.add((j, bus))
+                    neighbours.append((self.nodeNames[j], self.busNames[bus]))
+        return neighbours
+
+    def Wiring(self, nodeA: str, nodeB: str) -> list[tuple[str, str | None, str | None, list[tuple[str, str, str]]]]:
+        """
+        How two nodes are wired to each other: `(bus, connectionA, connectionB, pins)` for each pair of their
+        connections on the same bus, where `pins` pairs up `(net, pinA, pinB)` by net.
+        """
+        a, b = self._Node(nodeA), self._Node(nodeB)
+        wiring = []
+        for ca in range(self._nodePtr[a], self._nodePtr[a + 1]):
+            for cb in range(self._nodePtr[b], self._nodePtr[b + 1]):
+                if self._connBus[ca] != self._connBus[cb]:
+                    continue
+                pinsB: dict[str, list[str]] = {}
+                for pin, net in self._Pins(cb):
+                    pinsB.setdefault(net, []).append(pin)
+                pins = [(net, pinA, pinB) for pinA, net in self._Pins(ca) for pinB in pinsB.get(net, ())]
+                wiring.append((self.busNames[self._connBus[ca]], self._connNames[ca], self._connNames[cb], pins))
+        return wiring
+
+    def IsReachable(self, nodeA: str, nodeB: str) -> bool:
+        """Whether there is any path of busses between the two nodes."""
+        return self._component[self._Node(nodeA)] == self._component[self._Node(nodeB)]
+
+    def Reachable(self, node: str) -> list[str]:
+        """Every other node there is a path of busses to."""
+        i = self._Node(node)
+        component = self._component[i]
+        return [name for j, name in enumerate(self.nodeNames) if j != i and self._component[j] == component]
+
+    def ShortestPath(self, nodeA: str, nodeB: str) -> list[tuple[str, str | None]] | None:
+        """
+        The fewest-hops path from `nodeA` to `nodeB` as `(node, bus it was reached over)` steps, starting with
+        `(nodeA, None)`, or None if they aren't connected.
+        """
+        a, b = self._Node(nodeA), self._Node(nodeB)
+        if self._component[a] != self._component[b]:
+            return None
+        # breadth-first from both ends a level at a time, always growing the smaller frontier, over the bipartite
+        #   graph with each bus expanded only once per side; each side: (cameFrom, depth, frontier, expandedBusses)
+        sides = [({a: None}, {a: 0}, [a], set()), ({b: None}, {b: 0}, [b], set())]
+        meet = a if a == b else None
+        while meet is None:
+            side = 0 if len(sides[0][2]) <= len(sides[1][2]) else 1
+            cameFrom, depth, frontier, expandedBusses = sides[side]
+            otherDepth = sides[1 - side][1]
+            nextFrontier = []
+            for i in frontier:
+                for c in range(self._nodePtr[i], self._nodePtr[i + 1]):
+                    bus = self._connBus[c]
+                    if bus in expandedBusses:
+                        continue
+                    expandedBusses.add(bus)
+                    for other in self._busConns[self._busPtr[bus]:self._busPtr[bus + 1]]:
+                        j = self._connNode[other]
+                        if j in cameFrom:
+                            continue
+                        cameFrom[j] = (i, bus)
+                        depth[j] = depth[i] + 1
+                        nextFrontier.append(j)
+                        # finish the level, then take the meeting point closest to the other end
+                        if j in otherDepth and (meet is None or otherDepth[j] < otherDepth[meet]):
+                            meet = j
+            sides[side] = (cameFrom, depth, nextFrontier, expandedBusses)
+
+        # walk back from the meeting point to a, then on from it to b
+        path = []
+        step = meet
+        while step is not None:
+            prev = sides[0][0][step]
+            path.append((self.nodeNames[step], self.busNames[prev[1]] if prev is not None else None))
+            step = prev[0] if prev is not None else None
+        path.reverse()
+        step = meet
+        while sides[1][0][step] is not None:
+            step, bus = sides[1][0][step]
+            path.append((self.nodeNames[step], self.busNames[bus]))
+        return path
+
+    def _Node(self, name: str) -> int:
+        try:
+            return self._nodeIndex[name]
+        except KeyError:
+            raise ValueError(f'No node named "{name}" in the map.') from None
+
+    def _Pins(self, c: int) -> list[tuple[str, str]]:
+        return self._pins[self._connPinPtr[c]:self._connPinPtr[c + 1]]
+
+    def _LabelComponents(self) -> array.array:
+        component = array.array('q', [-1]) * len(self.nodeNames)
+        busSeen = bytearray(len(self.busNames))
+        label = 0
+        for start in range(len(self.nodeNames)):
+            if component[start] != -1:
+                continue
+            component[start] = label
+            frontier = [start]
+            while frontier:
+                i = frontier.pop()
+                for c in range(self._nodePtr[i], self._nodePtr[i + 1]):
+                    bus = self._connBus[c]
+                    if busSeen[bus]:
+                        continue
+                    busSeen[bus] = 1
+                    for other in self._busConns[self._busPtr[bus]:self._busPtr[bus + 1]]:
+                        j = self._connNode[other]
+                        if component[j] == -1:
+                            component[j] = label
+                            frontier.append(j)
+            label += 1
+        return component
+
+class IncidenceMatrix:
+    """
+    A sparse incidence matrix between two kinds of rows in a map (e.g. nodes x busses), read straight from the
+    table linking them with a single grouped query.  Entry `(i, j)` counts the links between the row with rowid
+    `rowIds[i]` and the column with rowid `colIds[j]`; `RowIndex()`/`ColIndex()` go the other way.
+
+    It's held both as COO triplets (`rows`, `cols`, `data`) and as CSR (`indptr`, `cols`, `data`, with rows in
+    order and columns ascending within each row), in NumPy arrays, or `array.array`s when NumPy isn't installed.
+    `ToScipy()` hands it on to scipy.sparse for matrix products, e.g. node-to-node coupling as `A @ A.T`.
+    """
+
+    shape: tuple[int, int]
+    rowIds: any
+    colIds: any
+    rows: any
+    cols: any
+    data: any
+    indptr: any
+
+    def __init__(self, systemMap: SystemMap.SystemMap, rowTable: str, colTable: str, linkTable: str, rowColumn: str, colColumn: str):
+        self.rowIds = systemMap.QueryColumns(f'SELECT rowid FROM {rowTable} ORDER BY rowid')['rowid']
+        self.colIds = systemMap.QueryColumns(f'SELECT rowid FROM {colTable} ORDER BY rowid')['rowid']
+        self.shape = (len(self.rowIds), len(self.colIds))
+        links = systemMap.QueryColumns(f'SELECT {rowColumn} AS r, {colColumn} AS c, count(*) AS n FROM {linkTable} '
+                                       f'WHERE {rowColumn} IS NOT NULL AND {colColumn} IS NOT NULL '
+                                       f'GROUP BY {rowColumn}, {colColumn} ORDER BY {rowColumn}, {colColumn}')
+        self.data = links['n']
+        if numpy is not None:
+            self.rows = numpy.searchsorted(self.rowIds, links['r'])
+            self.cols = numpy.searchsorted(self.colIds, links['c'])
+            self.indptr = numpy.zeros(self.shape[0] + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(self.rows, minlength=self.shape[0]), out=self.indptr[1:])
+        else:
+            self._rowIndex = {rowid: i for i, rowid in enumerate(self.rowIds)}
+            self._colIndex = {rowid: j for j, rowid in enumerate(self.colIds)}
+            self.rows = array.array('q', (self._rowIndex[r] for r in links['r']))
+            self.cols = array.array('q', (self._colIndex[c] for c in links['c']))
+            self.indptr = _Offsets(self.rows, self.shape[0])
+
+    def RowIndex(self, rowid: int) -> int:
+        return self._Index(self.rowIds, rowid, '_rowIndex')
+
+    def ColIndex(self, rowid: int) -> int:
+        return self._Index(self.colIds, rowid, '_colIndex')
+
+    def RowSums(self) -> any:
+        """Total links per row (e.g. a node's connection count, or a connection's pin count)."""
+        return self._Sums(self.rows, self.shape[0])
+
+    def ColSums(self) -> any:
+        """Total links per column (e.g. a bus's fan-out)."""
+        return self._Sums(self.cols, self.shape[1])
+
+    def ToScipy(self) -> any:
+        """The matrix as a `scipy.sparse.csr_array`.  Needs SciPy (and NumPy)."""
+        import scipy.sparse
+        return scipy.sparse.csr_array((self.data, self.cols, self.indptr), shape=self.shape)
+
+    def _Sums(self, keys: any, n: int) -> any:
+        if numpy is not None:
+            return numpy.bincount(keys, weights=self.data, minlength=n).astype(numpy.int64)
+        sums = array.array('q', [0]) * n
+        for k, count in zip(keys, self.data):
+            sums[k] += count
+        return sums
+
+    def _Index(self, ids: any, rowid: int, fallback: str) -> int:
+        if numpy is not None:
+            i = int(numpy.searchsorted(ids, rowid))
+            if i < len(ids) and ids[i] == rowid:
+                return i
+        elif rowid in getattr(self, fallback):
+            return getattr(self, fallback)[rowid]
+        raise ValueError(f'No row with rowid {rowid} in the matrix.')
+
+def NodeBusIncidence(systemMap: SystemMap.SystemMap) -> IncidenceMatrix:
+    """Nodes x busses, counting each node's connections on each bus."""
+    return IncidenceMatrix(systemMap, 'nodes', 'busses', 'connections', 'node', 'bus')
+
+def ConnectionNetIncidence(systemMap: SystemMap.SystemMap) -> IncidenceMatrix:
+    """Connections x nets, counting each connection's pins on each net."""
+    return IncidenceMatrix(systemMap, 'connections', 'nets', 'pinouts', 'connection', 'net')
+
+def _Offsets(keys: array.array, n: int) -> array.array:
+    """CSR row pointers: where each of the `n` groups starts in `keys` sorted (the last entry is the total)."""
+    counts = array.array('q', [0]) * (n + 1)
+    for k in keys:
+        counts[k + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+    return counts
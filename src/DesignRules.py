@@ -0,0 +1,131 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import SystemMap
+
+class Rule:
+    """
+    A design rule, checked with one set-based query that returns a row per violation.  `message` is formatted with
+    each row's columns (e.g. `'Bus "{bus}" ...'`) to describe that violation.
+    """
+
+    name: str
+    severity: str
+    query: str
+    message: str
+
+    def __init__(self, name: str, severity: str, query: str, message: str):
+        if severity not in ('ERROR', 'WARNING'):
+            raise ValueError(f'Rule severity must be "ERROR" or "WARNING", not "{severity}".')
+        self.name = name
+        self.severity = severity
+        self.query = query
+        self.message = message
+
+
+RULES = [
+    Rule('single-node-bus', 'WARNING',
+         'SELECT b.name AS bus, min(n.name) AS node FROM busses b JOIN connections c ON c.bus = b.rowid '
+         'JOIN nodes n ON n.rowid = c.node GROUP BY b.rowid HAVING count(DISTINCT c.node) = 1 ORDER BY b.name',
+         'Bus "{bus}" only connects to node "{node}".'),
+    Rule('multiple-drivers', 'ERROR',
+         'SELECT b.name AS bus, count(*) AS drivers, group_concat(n.name || \'.\' || coalesce(c.name, \'?\'), \', \') AS connections '
+         'FROM connections c JOIN busses b ON b.rowid = c.bus JOIN nodes n ON n.rowid = c.node '
+         'WHERE c.direction = \'O\' GROUP BY c.bus HAVING count(*) > 1 ORDER BY b.name',
+         'Bus "{bus}" has {drivers} output drivers: {connections}.'),
+    Rule('duplicate-pin', 'ERROR',
+         'SELECT n.name AS node, c.name AS connection, d.pin, d.uses FROM '
+         '(SELECT connection, pin, count(*) AS uses FROM pinouts GROUP BY connection, pin HAVING count(*) > 1) d '
+         'JOIN connections c ON c.rowid = d.connection JOIN nodes n ON n.rowid = c.node ORDER BY n.name, c.name, d.pin',
+         'Pin "{pin}" is used {uses} times on connection "{connection}" of node "{node}".'),
+    Rule('unreferenced-net', 'WARNING',
+         'SELECT b.name AS bus, t.name AS net FROM nets t JOIN busses b ON b.rowid = t.bus '
+         'WHERE NOT EXISTS (SELECT 1 FROM pinouts p WHERE p.net = t.rowid) ORDER BY b.name, t.name',
+         'Net "{net}" on bus "{bus}" isn\'t pinned out anywhere.'),
+]
+
+
+class RuleResult:
+    """One rule's violations, as rows of the columns its query selects, and the seconds its query took."""
+
+    rule: Rule
+    columns: tuple[str, ...]
+    rows: list[tuple]
+    seconds: float
+
+    def __init__(self, rule: Rule, columns: tuple[str, ...], rows: list[tuple], seconds: float):
+        self.rule = rule
+        self.columns = columns
+        self.rows = rows
+        self.seconds = seconds
+
+    def Violations(self) -> list[dict[str, any]]:
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def Messages(self) -> list[str]:
+        return [self.rule.message.format(**violation) for violation in self.Violations()]
+
+
+class DesignRuleReport:
+    """The results of a design rule check, one `RuleResult` per rule in the order the rules were given."""
+
+    results: list[RuleResult]
+    seconds: float
+
+    def __init__(self, results: list[RuleResult], seconds: float):
+        self.results = results
+        self.seconds = seconds
+
+    def Passed(self, warningsFail: bool = False) -> bool:
+        return not any(r.rows for r in self.results if r.rule.severity == 'ERROR' or warningsFail)
+
+    def Report(self, maxPerRule: int | None = 20) -> list[str]:
+        """The violations as `ERROR:`/`WARNING:` lines, like an import's output, and at most `maxPerRule` per rule."""
+        report = []
+        for result in self.results:
+            messages = result.Messages()
+            shown = messages if maxPerRule is None else messages[:maxPerRule]
+            report.extend(f'{result.rule.severity}: {result.rule.name}: {message}' for message in shown)
+            if len(shown) < len(messages):
+                report.append(f'{result.rule.severity}: {result.rule.name}: ... and {len(messages) - len(shown)} more.')
+        counts = ', '.join(f'{result.rule.name} {len(result.rows)}' for result in self.results)
+        report.append(f'INFO: Checked {len(self.results)} rules in {self.seconds:.3f} s ({counts}).')
+        return report
+
+    def ToDict(self) -> dict[str, any]:
+        """The report as plain JSON-serializable data."""
+        return {
+            'passed': self.Passed(),
+            'seconds': self.seconds,
+            'rules': [{
+                'name': r.rule.name,
+                'severity': r.rule.severity,
+                'seconds': r.seconds,
+                'violations': r.Violations(),
+            } for r in self.results],
+        }
+
+
+def CheckDesignRules(systemMap: SystemMap.SystemMap, rules: list[Rule] | None = None, workers: int = 4) -> DesignRuleReport:
+    """
+    Runs `rules` (by default `RULES`) against the map, up to `workers` at a time.  Rules are independent queries,
+    so they run side by side on the map's read pool if it has one (`SystemMap.EnableReadPool()`); otherwise they
+    share its single connection and effectively run one after another.
+    """
+    rules = RULES if rules is None else rules
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max(1, min(workers, len(rules))), thread_name_prefix='DesignRules') as pool:
+        results = list(pool.map(lambda rule: _Check(systemMap, rule), rules))
+    return DesignRuleReport(results, time.perf_counter() - start)
+
+def _Check(systemMap: SystemMap.SystemMap, rule: Rule) -> RuleResult:
+    start = time.perf_counter()
+    with systemMap._ReadConnection() as db:
+        cursor = db.cursor()
+        try:
+            cursor.execute(rule.query)
+            rows = cursor.fetchall()
+            columns = tuple(d[0] for d in cursor.description)
+        finally:
+            cursor.close()
+    return RuleResult(rule, columns, rows, time.perf_counter() - start)
@@ -0,0 +1,90 @@
+import argparse
+import json
+import random
+
+# (signal, net names) for the kinds of bus a diagram is built from; busses with more nets than listed get numbered
+#   spares, e.g. a 9-net CAN bus is CANH, CANL, GND, SHLD, SP5 .. SP9
+SIGNALS = [
+    ('CAN', ['CANH', 'CANL', 'GND', 'SHLD']),
+    ('RS-422', ['TX+', 'TX-', 'RX+', 'RX-', 'GND', 'SHLD']),
+    ('Ethernet', ['TX+', 'TX-', 'RX+', 'RX-', 'SHLD']),
+    ('Quadrature [Indexed]', ['A', 'B', 'Z', 'A-', 'B-', 'Z-', '+5V', 'GND']),
+    ('Motor Power', ['U', 'V', 'W', 'PE']),
+    ('Analog', ['SIG+', 'SIG-', 'GND', 'SHLD']),
+    ('Power', ['+28V', 'RTN', 'CHASSIS']),
+]
+CONNECTORS = ['DB-9', 'DB-15', 'DB-25', 'M12', 'MIL-DTL-38999', 'RJ45', 'BNC', None]
+DIRECTIONS = ['I', 'O', 'IO']
+LOCATIONS = ['Rack A', 'Rack B', 'Bay 1', 'Bay 2', 'Mast', 'Hull', None]
+COLORS = ['black', 'red', 'white', 'blue', 'green', 'yellow', 'orange', 'brown']
+
+def GenerateDiagram(nNodes: int, nBusses: int = 50, netsPerBus: int = 8, connectionsPerNode: int = 4,
+                    pinoutDensity: float = 1.0, extraFields: int = 0, seed: int = 0) -> dict[str, list]:
+    """
+    Builds a hookup diagram dict that `ElectronicSystemMap` can import.  Every node gets `connectionsPerNode`
+    connections, each on a different randomly chosen bus, and each connection pins out `pinoutDensity` of its
+    bus's nets (at least one).  Objects at every level also carry `extraFields` keys the model doesn't know about,
+    which end up in `extraJson`.  The same arguments always produce the same diagram.
+    """
+    if connectionsPerNode > nBusses:
+        raise ValueError(f'Can\'t give each node {connectionsPerNode} connections on different busses with only {nBusses} busses.')
+    if not 0 < pinoutDensity <= 1:
+        raise ValueError(f'pinoutDensity must be in (0, 1], not {pinoutDensity}.')
+    rng = random.Random(seed)
+    pinsPerConnection = max(1, round(netsPerBus * pinoutDensity))
+
+    busNets = []
+    busses = []
+    for b in range(nBusses):
+        signal, names = SIGNALS[b % len(SIGNALS)]
+        nets = (names + [f'SP{n + 1}' for n in range(len(names), netsPerBus)])[:netsPerBus]
+        busNets.append(nets)
+        busses.append({
+            'name': f'Bus {b}',
+            'signal': signal,
+            'nets': [{'name': net, 'color': rng.choice(COLORS), **_Extra(rng, extraFields)} for net in nets],
+            **_Extra(rng, extraFields),
+        })
+
+    nodes = []
+    for i in range(nNodes):
+        connections = []
+        for c, b in enumerate(rng.sample(range(nBusses), connectionsPerNode)):
+            nets = rng.sample(busNets[b], pinsPerConnection) if pinsPerConnection < netsPerBus else busNets[b]
+            connections.append({
+                'name': f'J{c + 1}',
+                'bus': f'Bus {b}',
+                'int. cable': rng.random() < 0.2,
+                'int. connector': rng.random() < 0.5,
+                'connector': rng.choice(CONNECTORS),
+                'direction': rng.choice(DIRECTIONS),
+                'pinout': [{'pin': str(p + 1), 'net': net, **_Extra(rng, extraFields)} for p, net in enumerate(nets)],
+                **_Extra(rng, extraFields),
+            })
+        nodes.append({'name': f'Node {i}', 'location': rng.choice(LOCATIONS), 'connections': connections, **_Extra(rng, extraFields)})
+    return {'busses': busses, 'nodes': nodes}
+
+def NodesForPins(nPins: int, netsPerBus: int = 8, connectionsPerNode: int = 4, pinoutDensity: float = 1.0) -> int:
+    """How many nodes `GenerateDiagram()` needs (with the same layout arguments) for about `nPins` pinouts."""
+    pinsPerNode = connectionsPerNode * max(1, round(netsPerBus * pinoutDensity))
+    return max(1, round(nPins / pinsPerNode))
+
+def _Extra(rng: random.Random, n: int) -> dict[str, any]:
+    return {f'field {k}': rng.choice((rng.randrange(1000), f'value {rng.randrange(1000)}', rng.random() < 0.5)) for k in range(n)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes a synthetic hookup diagram JSON file.')
+    parser.add_argument('outFile')
+    parser.add_argument('--nodes', type=int, default=1000)
+    parser.add_argument('--pins', type=int, help='size the diagram by pinout count instead of --nodes')
+    parser.add_argument('--busses', type=int, default=50)
+    parser.add_argument('--nets-per-bus', type=int, default=8)
+    parser.add_argument('--connections-per-node', type=int, default=4)
+    parser.add_argument('--pinout-density', type=float, default=1.0)
+    parser.add_argument('--extra-fields', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    nNodes = args.nodes if args.pins is None else NodesForPins(args.pins, args.nets_per_bus, args.connections_per_node, args.pinout_density)
+    diagram = GenerateDiagram(nNodes, args.busses, args.nets_per_bus, args.connections_per_node, args.pinout_density, args.extra_fields, args.seed)
+    with open(args.outFile, 'w') as f:
+        json.dump(diagram, f)
@@ -0,0 +1,116 @@
+import codecs
+import json
+from typing import Any, BinaryIO, Iterator
+
+# what may follow a number in valid JSON
+_NUMBER_ENDS = frozenset(' \t\r\n,]}')
+
+class TopLevelReader:
+    """
+    Walks the top-level object of a JSON document read from a binary file without loading the whole thing.
+    `Keys()` yields each top-level key with the reader positioned at its value; calling `Elements()` then streams
+    the value's array elements one at a time.  Values the caller doesn't ask for are skipped (arrays element by
+    element, so skipping stays bounded too).
+    """
+
+    def __init__(self, f: BinaryIO, chunkSize: int = 1 << 16):
+        self._f = f
+        self._chunkSize = chunkSize
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._valueConsumed = True
+
+    def Keys(self) -> Iterator[str]:
+        self._Expect('{')
+        if self._Peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._Value()
+            if type(key) is not str:
+                raise ValueError('Top-level JSON object keys must be strings.')
+            self._Expect(':')
+            self._Peek()
+            self._valueConsumed = False
+            yield key
+            if not self._valueConsumed:
+                self._Skip()
+            c = self._Peek()
+            self._pos += 1
+            if c == '}':
+                return
+            elif c != ',':
+                raise ValueError(f'Malformed JSON: expected "," or "}}" after value of "{key}".')
+
+    def IsArray(self) -> bool:
+        """Whether the value the reader is positioned at is an array."""
+        return self._Peek() == '['
+
+    def Elements(self) -> Iterator[Any]:
+        """Streams the elements of the array at the current position.  Must be run to completion."""
+        self._valueConsumed = True
+        self._Expect('[')
+        if self._Peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._Value()
+            c = self._Peek()
+            self._pos += 1
+            if c == ']':
+                return
+            elif c != ',':
+                raise ValueError('Malformed JSON: expected "," or "]" after array element.')
+
+    def _Skip(self) -> None:
+        if self.IsArray():
+            for _ in self.Elements():
+                pass
+        else:
+            self._valueConsumed = True
+            self._Value()
+
+    def _Fill(self, size: int) -> bool:
+        # drop what's been consumed so the buffer only ever holds the value being decoded
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+        data = self._f.read(size)
+        if not data:
+            self._buf += self._decoder.decode(b'', final=True)
+            self._eof = True
+            return False
+        self._buf += self._decoder.decode(data)
+        return True
+
+    def _Peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._Fill(self._chunkSize):
+                return ''
+
+    def _Expect(self, c: str) -> None:
+        if self._Peek() != c:
+            raise ValueError(f'Malformed JSON: expected "{c}".')
+        self._pos += 1
+
+    def _Value(self) -> Any:
+        self._Peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # a number is only complete once something that can follow it has been read (`1.` decodes as `1`,
+                #   `1.5e` as `1.5`); strings, arrays and objects end in their own closing character
+                if self._eof or (end < len(self._buf) and (type(value) not in (int, float) or self._buf[end] in _NUMBER_ENDS)):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # read progressively more so large values don't get re-decoded once per chunk
+            self._Fill(max(self._chunkSize, len(self._buf) - self._pos))
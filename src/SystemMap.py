@@ -1,80 +1,510 @@
 import sqlite3
+import array
+import copy
+import functools
+import hashlib
 import json
 import os
+import queue
 import re
-from typing import Iterable, Type, get_type_hints
-from typeguard import check_type, TypeCheckError
+import threading
+import time
+import types
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, BinaryIO, Callable, ClassVar, Iterable, Iterator, Type, Union, get_args, get_origin, get_type_hints
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import JsonStream
+
+def _Writes(method):
+    """Serialises a `SystemMap` method that writes through the map's single writer connection."""
+    @functools.wraps(method)
+    def Locked(self: 'SystemMap', *args, **kwargs):
+        with self._writeLock:
+            return method(self, *args, **kwargs)
+    return Locked
 
 class SystemMap:
 
     _dataDir: str
+    _dbPath: str
     _db: sqlite3.Connection
+    _inMemory: bool
+    _writeLock: threading.RLock
+    _readPool: 'queue.Queue[sqlite3.Connection] | None' = None
+    _readTimeout: float = 30.0
+    queryCache: 'QueryCache | None' = None
+    stats: 'MapStats | None' = None
+    _session: 'MapSession | None' = None
+
+    _streamFlushRows: int = 50000
+    _hydrationChunk: int = 500
+    _schemaVersion: int = 4
+    _searchTables: list[str] | None = None
+
+    def __init__(self, name: str, dataDir: str, jsonStr: str | None = None, supportedObjects: Iterable['MapObject'] | None = None,
+                 jsonFile: str | os.PathLike | BinaryIO | None = None, inMemory: bool = False):
+        """
+        Opens the map `name` in `dataDir`.  Given `jsonStr`, or `jsonFile` (a path or binary file object), the map is
+        built from it, or brought up to date if it already exists.  Without either, an existing map is opened as it
+        is, after checking its schema version and (if `supportedObjects` is given) the object types it was built with.
 
-    def __init__(self, name: str, dataDir: str, jsonStr: str | None = None, supportedObjects: Iterable['MapObject'] | None = None):
-        """Initializes empty system map."""
+        With `inMemory`, the map lives in an in-memory database: an existing map is copied into memory first, and
+        anything built or imported is written to `{name}.db` in one step afterwards with `SaveToDisk()`.
+        """
 
         dbPath = os.path.join(dataDir, f'{name}.db')
 
         # validate arguments
-        if jsonStr is None and supportedObjects is None:
-            self._ConnectDb(os.path.join)
-            return
-        elif jsonStr is not None and supportedObjects is not None:
-            pass
-        else:
-            raise ValueError('Either both `jsonStr` and `supportedObjects` arguments must be supplied or neither.')
+        if jsonStr is not None and jsonFile is not None:
+            raise ValueError('Only one of `jsonStr` and `jsonFile` may be supplied.')
+        hasJson = jsonStr is not None or jsonFile is not None
+        if hasJson and supportedObjects is None:
+            raise ValueError('`supportedObjects` must be supplied to load JSON.')
+
+        # an existing map is brought up to date instead of rebuilt (a no-op if the JSON hasn't changed)
+        isNew = not os.path.exists(dbPath)
+        if isNew and not hasJson:
+            raise FileNotFoundError(f'No map with name "{name}" exists in "{dataDir}"')
 
-        # make sure the name doesn't exist already
-        if os.path.exists(dbPath):
-            raise FileExistsError(f'A map with name "{name}" already exists in "{dataDir}"')
-        
         # open the database connection
-        self._ConnectDb(dbPath)
-        
+        self._writeLock = threading.RLock()
+        self._poolLock = threading.Lock()
         self._dataDir = dataDir
-        self._SetupDb(supportedObjects)
+        self._dbPath = dbPath
+        self._inMemory = inMemory
+        if inMemory:
+            self._ConnectMemoryDb(None if isNew else dbPath)
+        else:
+            self._ConnectDb(dbPath)
+
+        if isNew:
+            self._SetupDb(supportedObjects)
+        else:
+            self._CheckSchema(dbPath, supportedObjects)
 
         # load json if given
-        self.LoadFromJson(jsonStr, supportedObjects, True)
-        #                                            ^ TODO partial-imports not supported yet
+        if jsonStr is not None:
+            self.LoadFromJson(jsonStr, supportedObjects, isNew)
+        elif jsonFile is not None:
+            self.LoadFromJsonFile(jsonFile, supportedObjects, isNew)
+
+        if inMemory and hasJson:
+            self.SaveToDisk()
 
     def __del__(self):
         try:
+            self.DisableReadPool()
             self._db.close()
         except: # TODO make this more specific?
             pass
 
     def Query(self, q: str, values: tuple | None = None):
-        cursor = self._db.cursor()
-        if values is None:
-            cursor.execute(q)
-        else:
-            cursor.execute(q, values)
-        res = cursor.fetchall()
-        cursor.close()
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        cache = self.queryCache
+        if cache is not None:
+            changes = self._db.total_changes
+            res = cache.Get(q, values, changes)
+            if res is not None:
+                if stats is not None:
+                    stats._Queried(q, values, time.perf_counter() - start)
+                return res
+            cacheable = not self._db.in_transaction
+        with self._ReadConnection() as db:
+            cursor = db.cursor()
+            if values is None:
+                cursor.execute(q)
+            else:
+                cursor.execute(q, values)
+            res = cursor.fetchall()
+            returnsRows = cursor.description is not None
+            cursor.close()
         # self._db.commit()
+        if cache is not None:
+            # statements without result columns (DDL, PRAGMA assignments, ...) may change the map without moving
+            #   `total_changes`, so they're never cached and anything cached may be out of date after them
+            if not returnsRows:
+                cache.Clear()
+            # only keep results nothing could have been writing underneath (including the statement itself)
+            elif cacheable and not self._db.in_transaction and self._db.total_changes == changes:
+                cache.Put(q, values, res, changes)
+        if stats is not None:
+            stats._Queried(q, values, time.perf_counter() - start)
         return res
 
+    def EnableReadPool(self, size: int = 4) -> None:
+        """
+        Switches the map's `.db` to WAL journaling and opens `size` read-only connections that `Query()` and friends
+        hand out to whichever thread is asking, so reads run concurrently with each other and with an import on the
+        writer connection.  A read waits up to `_readTimeout` seconds for a connection to come free before raising
+        `TimeoutError`.  Not available for in-memory maps.
+        """
+        if self._inMemory:
+            raise ValueError('A read pool needs the map to be on disk; in-memory maps only have one connection.')
+        self.DisableReadPool()
+        with self._writeLock:
+            self._db.execute('PRAGMA journal_mode = WAL')
+        pool: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(self._dbPath, check_same_thread=False)
+            conn.execute('PRAGMA query_only = ON')
+            if self.stats is not None:
+                self.stats._Attach(conn)
+            pool.put(conn)
+        self._readPool = pool
+
+    def DisableReadPool(self) -> None:
+        """Closes the read pool's connections; ones checked out at the time are closed as they're handed back."""
+        with self._poolLock:
+            pool = self._readPool
+            self._readPool = None
+        while pool is not None and not pool.empty():
+            pool.get().close()
+
+    @contextmanager
+    def _ReadConnection(self, lockWriter: bool = True) -> Iterator[sqlite3.Connection]:
+        # without a read pool this is the writer connection, which an import on another thread may be in the middle
+        #   of a transaction on, so it's held under the write lock (unless the caller takes that itself)
+        pool = self._readPool
+        if pool is None:
+            if not lockWriter:
+                yield self._db
+                return
+            with self._writeLock:
+                yield self._db
+            return
+        try:
+            conn = pool.get(timeout=self._readTimeout)
+        except queue.Empty:
+            raise TimeoutError(f'No read pool connection came free within {self._readTimeout} s.  `QueryIter()` iterators keep '
+                               'theirs until they\'re run to the end or closed.') from None
+        try:
+            yield conn
+        finally:
+            with self._poolLock:
+                if self._readPool is pool:
+                    pool.put(conn)
+                    conn = None
+            if conn is not None: # the pool was disabled (or replaced) in the meantime
+                conn.close()
+
+    def EnableQueryCache(self, maxEntries: int = 256, maxRows: int = 100000) -> 'QueryCache':
+        """
+        Turns on an LRU cache of `Query()` results keyed by SQL and parameters.  It's emptied automatically whenever
+        anything (an import, `StoreInDb()`, a write through `Query()`) changes the map through this object.
+        """
+        self.queryCache = QueryCache(maxEntries, maxRows)
+        return self.queryCache
+
+    def DisableQueryCache(self) -> None:
+        self.queryCache = None
+
+    def EnableStats(self, slowQueryMs: float = 100.0, onStatement: Callable[[str], None] | None = None,
+                    onSlowQuery: Callable[[str, tuple | None, float], None] | None = None,
+                    onImport: Callable[[dict[str, float]], None] | None = None) -> 'MapStats':
+        """
+        Turns on instrumentation (see `MapStats`): import phase timers, SQL statement and commit counts through SQLite
+        trace callbacks on the writer connection and any read pool, and a log of `Query()` calls slower than
+        `slowQueryMs`.  Read pool connections that are checked out at the time aren't traced.
+        """
+        self.DisableStats()
+        stats = MapStats(slowQueryMs, onStatement, onSlowQuery, onImport)
+        with self._writeLock:
+            stats._Attach(self._db)
+        if self._readPool is not None:
+            for conn in list(self._readPool.queue):
+                stats._Attach(conn)
+        self.stats = stats
+        return stats
+
+    def DisableStats(self) -> None:
+        stats = self.stats
+        self.stats = None
+        if stats is None:
+            return
+        with self._writeLock:
+            self._db.set_trace_callback(None)
+        if self._readPool is not None:
+            for conn in list(self._readPool.queue):
+                conn.set_trace_callback(None)
+
+    def QueryIter(self, q: str, values: tuple | None = None, arraysize: int = 1000) -> Iterator[tuple]:
+        """
+        Like `Query()`, but yields rows lazily, fetching `arraysize` of them from SQLite at a time.  Without a read
+        pool each batch is fetched under the write lock rather than the whole iteration, so the iterator can be
+        advanced from any thread, and an import may run (and commit) between two batches.  With a read pool the
+        iterator keeps its connection until it's run to the end or closed, so don't leave iterators lying around.
+        """
+        with self._ReadConnection(lockWriter=False) as db:
+            lock = self._writeLock if db is self._db else nullcontext()
+            cursor = db.cursor()
+            cursor.arraysize = arraysize
+            try:
+                with lock:
+                    if values is None:
+                        cursor.execute(q)
+                    else:
+                        cursor.execute(q, values)
+                    rows = cursor.fetchmany()
+                while rows:
+                    yield from rows
+                    with lock:
+                        rows = cursor.fetchmany()
+            finally:
+                with lock:
+                    cursor.close()
+
+    def QueryColumns(self, q: str, values: tuple | None = None, arraysize: int = 1000) -> dict[str, any]:
+        """
+        Runs `q` and returns the result column by column: column name -> NumPy array, or `array.array` when NumPy
+        isn't installed.  Integer and real columns are packed as rows are fetched; columns holding anything else
+        (text, NULLs) become object arrays, or plain lists without NumPy.
+        """
+        with self._ReadConnection() as db:
+            cursor = db.cursor()
+            cursor.arraysize = arraysize
+            try:
+                if values is None:
+                    cursor.execute(q)
+                else:
+                    cursor.execute(q, values)
+                names = [d[0] for d in cursor.description]
+                columns: list[array.array | list] = [array.array('q') for _ in names]
+                while rows := cursor.fetchmany():
+                    for i, colValues in enumerate(zip(*rows)):
+                        columns[i] = _ExtendColumn(columns[i], colValues)
+            finally:
+                cursor.close()
+        return {name: _FinishColumn(column) for name, column in zip(names, columns)}
+
+    def Session(self) -> 'MapSession':
+        """Starts a new `MapSession`: objects read through it are separate from those of any other session."""
+        return MapSession(self)
+
+    def GetObject(self, objType: Type['MapObject'], rowid: int) -> 'MapObject | None':
+        """Reads the `objType` stored under `rowid` back through the map's default `MapSession`."""
+        return self._DefaultSession().Get(objType, rowid)
+
+    def FindObjects(self, objType: Type['MapObject'], **props: any) -> list['MapObject']:
+        """Reads back every `objType` whose properties equal `props` (e.g. `name='Motor'`) through the default `MapSession`."""
+        return self._DefaultSession().Find(objType, **props)
+
+    def _DefaultSession(self) -> 'MapSession':
+        if self._session is None:
+            self._session = MapSession(self)
+        return self._session
+
+    def Search(self, text: str, objTypes: Iterable[Type['MapObject']] | None = None, limit: int = 100,
+               raw: bool = False) -> list[tuple[str, int, str]]:
+        """
+        Full-text search over the searchable objects (the ones with `SearchColumns()`): those columns plus every key
+        and value in their `extraJson`, nested ones included.  Returns `(table, rowid, text)` for the best `limit`
+        matches, best first, where `text` is the object's search columns.  `text` is taken as words that must all
+        appear, each matched literally (so `X-123` is fine); with `raw`, it's an FTS5 query instead, e.g.
+        `extra:"rack 4" OR text:motor*`.
+        """
+        if not text.strip():
+            raise ValueError('Search text must not be empty.')
+        if self._searchTables is None:
+            with self._writeLock:
+                self._searchTables = json.loads(self._GetMeta('searchTables'))
+        tables = self._searchTables
+        if not tables:
+            return []
+        match = text if raw else ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+        q = 'SELECT rowid, text FROM search_index WHERE search_index MATCH ?'
+        values: list[any] = [match]
+        if objTypes is not None:
+            unsearchable = [t.__name__ for t in objTypes if t.TableName() not in tables]
+            if unsearchable:
+                raise ValueError(f'{", ".join(unsearchable)} can\'t be searched; only objects with `SearchColumns()` are indexed.')
+            kinds = [tables.index(t.TableName()) for t in objTypes]
+            q += f' AND rowid % {len(tables)} IN ({", ".join("?" * len(kinds))})'
+            values.extend(kinds)
+        q += ' ORDER BY rank LIMIT ?'
+        values.append(limit)
+        return [(tables[rowid % len(tables)], rowid // len(tables), found) for rowid, found in self.Query(q, tuple(values))]
+
+    @_Writes
+    def PromoteJsonKey(self, objType: Type['MapObject'], key: str, column: str | None = None) -> str:
+        """
+        Promotes `key` of `objType`'s `extraJson` to an indexed generated column, so filtering on it (e.g. `WHERE
+        partNumber = ?`) is an index seek rather than parsing every row's JSON.  Returns the column, by default the
+        key camelCased the way incoming JSON keys are mapped onto properties.  Promotions are part of the map; promoting
+        a key that already is does nothing.
+        """
+        table = objType.TableName()
+        if column is None:
+            column = re.sub(r'([a-zA-Z])[\s,.]+([a-zA-Z])', lambda m : m.group(1) + m.group(2).capitalize(), key)
+        if not re.fullmatch(r'[A-Za-z_]\w*', column):
+            raise ValueError(f'"{column}" can\'t be used as a column name; pass `column` to name it.')
+        if '"' in key:
+            raise ValueError(f'extraJson key {key!r} can\'t be promoted: it contains a double quote.')
+        promoted: dict[str, dict[str, str]] = json.loads(self._GetMeta('promotedKeys') or '{}')
+        if promoted.get(table, {}).get(column) == key:
+            return column
+        if any(row[1] == column for row in self._db.execute(f'PRAGMA table_xinfo({table})')):
+            raise ValueError(f'Table "{table}" already has a column "{column}".')
+        path = '$."' + key.replace("'", "''") + '"'
+        try:
+            cursor = self._db.cursor()
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} GENERATED ALWAYS AS (json_extract(extraJson, '{path}')) VIRTUAL")
+            cursor.execute(f'CREATE INDEX {table}_by_{column} ON {table} ({column})')
+            promoted.setdefault(table, {})[column] = key
+            self._SetMeta('promotedKeys', json.dumps(promoted))
+            self._db.commit()
+            cursor.close()
+        except:
+            self._db.rollback()
+            raise
+        if self.queryCache is not None:
+            self.queryCache.Clear() # `SELECT *` results just grew a column
+        return column
+
+    def PromotedKeys(self) -> dict[str, dict[str, str]]:
+        """The `extraJson` keys promoted with `PromoteJsonKey()`: table -> column -> key."""
+        with self._writeLock:
+            return json.loads(self._GetMeta('promotedKeys') or '{}')
+
+    def ExplainQuery(self, q: str, values: tuple | None = None) -> list[str]:
+        """Returns SQLite's plan for `q`, one step per line (e.g. "SEARCH connections USING INDEX ..." or "SCAN ...")."""
+        return [row[3] for row in self.Query(f'EXPLAIN QUERY PLAN {q}', values)]
+
+    @_Writes
+    def SaveToDisk(self, dbPath: str | None = None) -> None:
+        """Writes a consistent snapshot of the map to `dbPath` (by default the map's own `.db`) with SQLite's backup API."""
+        target = sqlite3.connect(dbPath if dbPath is not None else self._dbPath)
+        try:
+            self._db.backup(target)
+        finally:
+            target.close()
+
     def _ConnectDb(self, dbDir: str):
-        self._db = sqlite3.connect(dbDir)
+        self._db = sqlite3.connect(dbDir, check_same_thread=False)
+        cursor = self._db.cursor()
+        cursor.execute('PRAGMA foreign_keys = ON')
+
+    def _ConnectMemoryDb(self, loadFrom: str | None):
+        self._db = sqlite3.connect(':memory:', check_same_thread=False)
+        if loadFrom is not None:
+            source = sqlite3.connect(loadFrom)
+            try:
+                source.backup(self._db)
+            finally:
+                source.close()
         cursor = self._db.cursor()
         cursor.execute('PRAGMA foreign_keys = ON')
+        # nothing to be durable about until the snapshot, but keep a rollback journal so failed imports still roll back
+        cursor.execute('PRAGMA journal_mode = MEMORY')
+        cursor.execute('PRAGMA synchronous = OFF')
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        cursor.close()
+
+    @_Writes
+    def LoadFromJson(self, jsonStr: str, supportedObjects: Iterable[Type['MapObject']], eraseExisting: bool, workers: int | None = None) -> list[str]:
+        """
+        Imports a JSON hookup diagram in a single transaction.  Rows are gathered per table and written with
+        `executemany()`; if any object fails validation or storage, nothing from this import is kept.  Unless
+        `eraseExisting` is set, the import is diffed against the map's current contents so only changed rows are
+        written, and the output includes a per-table change summary.
 
-    def LoadFromJson(self, jsonStr: str, supportedObjects: Iterable[Type['MapObject']], eraseExisting: bool) -> list[str]:
+        Content hashes of the whole JSON and of each top-level object are kept in the map: re-importing identical
+        JSON does nothing, and top-level objects (e.g. a node and everything under it) that are unchanged since the
+        last import aren't hydrated or stored again.
+
+        With `workers`, top-level objects are hydrated and validated in that many worker processes, and this
+        process only replays the rows they produce into the batch, in order.  Errors report the JSON path of the
+        offending object (e.g. `nodes[12].connections[3]`) either way.
+        """
         output: list[str] = []
+        jsonHash = hashlib.sha256(jsonStr.encode()).hexdigest()
+        return self._Import(supportedObjects, eraseExisting, jsonHash, self._JsonElements(jsonStr, supportedObjects, output), output, workers)
 
-        # load in as dict
-        j: dict[str, any] = json.loads(jsonStr)
+    @_Writes
+    def LoadFromJsonFile(self, jsonFile: str | os.PathLike | BinaryIO, supportedObjects: Iterable[Type['MapObject']], eraseExisting: bool,
+                         workers: int | None = None) -> list[str]:
+        """
+        Streaming counterpart to `LoadFromJson()` for diagrams too big to hold in memory.  Top-level arrays are
+        parsed incrementally and each element is hydrated and stored before the next is read, with queued rows
+        flushed every `_streamFlushRows` rows, all inside one transaction.  If the file lists e.g. nodes before the
+        busses they reference, it is read once per top-level key, which requires a seekable file.  Content hashes
+        are used the same way as in `LoadFromJson()`, except that the whole-file check needs a seekable file, and so
+        are `workers`.
+        """
+        output: list[str] = []
+        ownsFile = not hasattr(jsonFile, 'read')
+        f: BinaryIO = open(jsonFile, 'rb') if ownsFile else jsonFile
+        try:
+            return self._Import(supportedObjects, eraseExisting, self._FileHash(f), self._JsonFileElements(f, supportedObjects, output),
+                                output, workers, self._streamFlushRows)
+        finally:
+            if ownsFile:
+                f.close()
 
-        # figure out which are the top-level keys
-        reqdKeys = []
-        for objType in supportedObjects:
-            try:
-                reqdKeys.append(objType.JsonKey())
-            except NotImplementedError:
-                pass
+    def _Import(self, supportedObjects: Iterable[Type['MapObject']], eraseExisting: bool, jsonHash: str | None,
+                elementsByKey: Iterable[tuple[str, Iterable[dict[str, any]]]], output: list[str], workers: int | None,
+                flushRows: int | None = None) -> list[str]:
+        """
+        The import both `LoadFromJson()` and `LoadFromJsonFile()` run: stores each top-level key's elements, as
+        `elementsByKey` yields them in load order, in one transaction, then reports.  `output` holds whatever
+        `elementsByKey` had to say about the JSON by then.
+        """
+        if not eraseExisting and jsonHash is not None and jsonHash == self._GetMeta('jsonHash'):
+            return ['INFO: JSON unchanged since the last import, nothing to do.']
+        types = dict(self._TopLevelTypes(supportedObjects))
+
+        start = time.perf_counter()
+        pool = ProcessPoolExecutor(workers) if workers else None
+        stats = _instrumented.stats = self.stats
+        try:
+            # keeps the tables' triggers from throwing away the content hashes this import is about to update
+            self._SetMeta('importing', '1')
+            batch = self._NewBatch(supportedObjects, eraseExisting, flushRows)
+            storedHashes = self._StoredHashes(batch)
+            knownHashes = self._KnownHashes(storedHashes)
+            newHashes: list[tuple[str, str, int]] = []
+            for key, elements in elementsByKey:
+                if self._StoreObjects(batch, key, types[key], elements, supportedObjects, knownHashes, newHashes, pool, workers or 0):
+                    knownHashes = None # later object types may depend on this one (e.g. nodes on busses)
+            with _Phase(stats, 'store'):
+                batch.Finish()
+                self._SaveHashes(jsonHash, storedHashes, newHashes)
+                self._RebuildSearch(supportedObjects)
+                self._db.execute("DELETE FROM metadata WHERE key = 'importing'")
+            with _Phase(stats, 'commit'):
+                self._db.commit()
+        except:
+            self._db.rollback()
+            raise
+        finally:
+            _instrumented.stats = None
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        output.extend(self._ImportReport(batch, start))
+        with _Phase(stats, 'analyze'):
+            self._Analyze(eraseExisting)
+        if stats is not None:
+            stats._Imported()
+
+        return output
+
+    def _JsonElements(self, jsonStr: str, supportedObjects: Iterable[Type['MapObject']], output: list[str]) -> Iterator[tuple[str, list[dict[str, any]]]]:
+        # load in as dict
+        with _Phase(self.stats, 'parse'):
+            j: dict[str, any] = json.loads(jsonStr)
 
         # verify top-level keys
+        topLevel = self._TopLevelTypes(supportedObjects)
+        reqdKeys = [key for key, _ in topLevel]
         for key in reqdKeys:
             if key not in j.keys():
                 raise ValueError(f'Input JSON must include "{key}" key at top level.')
@@ -84,85 +514,1611 @@ class SystemMap:
             if key not in reqdKeys:
                 output.append(f'WARNING: Unknown top-level key "{key}" in JSON will be ignored.  Arbitrary JSON data only supported at lower levels.')
 
-        # load top-level objects in
-        supportedObjects.reverse() # so e.g. busses are loaded before connections which reference them
+        for key in reversed(reqdKeys): # so e.g. busses are loaded before connections which reference them
+            yield key, j[key]
+
+    def _JsonFileElements(self, f: BinaryIO, supportedObjects: Iterable[Type['MapObject']], output: list[str]) -> Iterator[tuple[str, Iterator[dict[str, any]]]]:
+        # each element list has to be used up before the next one is asked for, since they're all read off `f`
+        stats = self.stats
+        reqdKeys = [key for key, _ in self._TopLevelTypes(supportedObjects)]
+        toLoad = list(reversed(reqdKeys)) # so e.g. busses are loaded before connections which reference them
+        seenKeys: set[str] = set()
+        firstPass = True
+        while toLoad:
+            if not firstPass:
+                if not f.seekable():
+                    raise ValueError(f'Top-level JSON key "{toLoad[0]}" must come after the keys it references when streaming from a non-seekable file.')
+                f.seek(0)
+            reader = JsonStream.TopLevelReader(f)
+            for key in reader.Keys():
+                if firstPass:
+                    seenKeys.add(key)
+                    if key not in reqdKeys:
+                        output.append(f'WARNING: Unknown top-level key "{key}" in JSON will be ignored.  Arbitrary JSON data only supported at lower levels.')
+                if toLoad and key == toLoad[0]:
+                    if not reader.IsArray():
+                        raise ValueError(f'Top-level JSON key "{key}" must contain a list.')
+                    yield key, (reader.Elements() if stats is None else stats._Parsing(reader.Elements()))
+                    toLoad.pop(0)
+                elif not toLoad and not firstPass:
+                    break
+            if firstPass:
+                for key in reqdKeys:
+                    if key not in seenKeys:
+                        raise ValueError(f'Input JSON must include "{key}" key at top level.')
+            firstPass = False
+
+    def ExportJsonFile(self, jsonFile: str | os.PathLike | BinaryIO, supportedObjects: Iterable[Type['MapObject']]) -> None:
+        """
+        Writes the map back out as hookup-diagram JSON (UTF-8) to a path or binary file object, one top-level key per
+        top-level type and members nested under their parents, each object's stored `extraJson` keys included.  Each
+        table is read with a single query joined up its `Parent()` chain and ordered to match, and those are walked
+        side by side, so only one top-level object is held in memory at a time.
+        """
+        ownsFile = not hasattr(jsonFile, 'write')
+        f: BinaryIO = open(jsonFile, 'wb') if ownsFile else jsonFile
+        try:
+            # without a read pool this holds the write lock throughout, so imports wait rather than commit (or roll
+            #   back) underneath the snapshot
+            with self._ReadConnection() as db:
+                # keep every table's query on the same snapshot
+                snapshot = not db.in_transaction
+                if snapshot:
+                    db.execute('BEGIN')
+                try:
+                    f.write(b'{')
+                    for n, (key, objType) in enumerate(self._TopLevelTypes(supportedObjects)):
+                        f.write(f'{"," if n else ""}\n{json.dumps(key)}: ['.encode())
+                        rows = _ExportRows(db, objType)
+                        for i, row in enumerate(rows.RowsOf(None)):
+                            parts = [',\n' if i else '\n']
+                            rows.Write(row, parts)
+                            f.write(''.join(parts).encode())
+                        f.write(b'\n]')
+                    f.write(b'\n}\n')
+                finally:
+                    if snapshot:
+                        db.rollback()
+        finally:
+            if ownsFile:
+                f.close()
+
+    def _StoreObjects(self, batch: 'ImportBatch', jsonKey: str, objType: Type['MapObject'], elements: Iterable[dict[str, any]],
+                      supportedObjects: Iterable[Type['MapObject']], knownHashes: dict[str, dict[str, list[int]]] | None,
+                      newHashes: list[tuple[str, str, int]], pool: ProcessPoolExecutor | None = None, workers: int = 0) -> bool:
+        """
+        Hydrates and stores top-level `elements`, except ones whose content hash is in `knownHashes` (i.e. stored
+        by the last import), which are kept as they are.  Returns whether anything was added, changed or removed.
+        With a `pool`, elements are sent to it in chunks and a few chunks per worker are kept in flight.
+        """
+        known = knownHashes.get(jsonKey, {}) if knownHashes is not None else None
+        changed = False
+        inFlight: deque[tuple[list[tuple[int, dict[str, any], str, int | None]], Future | None]] = deque()
+        chunk: list[tuple[int, dict[str, any], str, int | None]] = []
+        for i, jo in enumerate(elements):
+            objHash = self._ObjectHash(jo)
+            rowids = known.get(objHash) if known is not None else None
+            chunk.append((i, jo, objHash, rowids.pop() if rowids else None))
+            if pool is None or len(chunk) == self._hydrationChunk:
+                inFlight.append((chunk, self._Hydrate(pool, jsonKey, objType, supportedObjects, chunk)))
+                chunk = []
+                while len(inFlight) > 2 * workers:
+                    changed |= self._StoreChunk(batch, jsonKey, objType, supportedObjects, *inFlight.popleft(), newHashes)
+        if chunk:
+            inFlight.append((chunk, self._Hydrate(pool, jsonKey, objType, supportedObjects, chunk)))
+        while inFlight:
+            changed |= self._StoreChunk(batch, jsonKey, objType, supportedObjects, *inFlight.popleft(), newHashes)
+        return changed or (known is not None and any(known.values()))
+
+    @staticmethod
+    def _Hydrate(pool: ProcessPoolExecutor | None, jsonKey: str, objType: Type['MapObject'], supportedObjects: Iterable[Type['MapObject']],
+                 chunk: list[tuple[int, dict[str, any], str, int | None]]) -> Future | None:
+        if pool is None:
+            return None
+        toHydrate = [(i, jo) for i, jo, _, keptId in chunk if keptId is None]
+        return pool.submit(_HydrateChunk, jsonKey, objType, tuple(supportedObjects), toHydrate) if toHydrate else None
+
+    @staticmethod
+    def _StoreChunk(batch: 'ImportBatch', jsonKey: str, objType: Type['MapObject'], supportedObjects: Iterable[Type['MapObject']],
+                    chunk: list[tuple[int, dict[str, any], str, int | None]], hydrated: Future | None, newHashes: list[tuple[str, str, int]]) -> bool:
+        stats = _instrumented.stats
+        recorded = None
+        if hydrated is not None:
+            with _Phase(stats, 'hydrate'): # the time spent waiting on the worker processes
+                recorded = iter(hydrated.result())
+        changed = False
+        for i, jo, objHash, keptId in chunk:
+            if keptId is not None and batch.Keep(objType.TableName(), keptId):
+                rowid = keptId
+            else:
+                # objects expected to be kept weren't sent to the worker processes
+                replay = recorded if keptId is None else None
+                try:
+                    if stats is None:
+                        rowid = _Replay(batch, *next(replay)) if replay is not None else None
+                        if rowid is None:
+                            rowid = objType(jo, supportedObjects).StoreInBatch(batch)
+                    else:
+                        with stats.Phase('store'):
+                            rowid = _Replay(batch, *next(replay)) if replay is not None else None
+                        if rowid is None:
+                            with stats.Phase('hydrate'):
+                                o = objType(jo, supportedObjects)
+                            with stats.Phase('store'):
+                                rowid = o.StoreInBatch(batch)
+                except (TypeError, ValueError) as e:
+                    raise _WithJsonPath(e, f'{jsonKey}[{i}]') from None
+                changed = True
+            newHashes.append((jsonKey, objHash, rowid))
+        return changed
+
+    @staticmethod
+    def _ObjectHash(jo: dict[str, any]) -> str:
+        return hashlib.sha256(json.dumps(jo, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+    @staticmethod
+    def _FileHash(f: BinaryIO) -> str | None:
+        if not f.seekable():
+            return None
+        h = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+        f.seek(0)
+        return h.hexdigest()
+
+    def _StoredHashes(self, batch: 'ImportBatch') -> dict[tuple[str, int], str] | None:
+        # hashes only help when diffing against what's already there
+        if not isinstance(batch, IncrementalBatch):
+            return None
+        return {(jsonKey, objectId): objHash for jsonKey, objHash, objectId in
+                self._db.execute('SELECT jsonKey, hash, objectId FROM importhashes ORDER BY objectId DESC')}
+
+    @staticmethod
+    def _KnownHashes(storedHashes: dict[tuple[str, int], str] | None) -> dict[str, dict[str, list[int]]] | None:
+        # jsonKey -> hash -> rowids stored with that content, highest first so `pop()` hands them out in rowid order
+        if storedHashes is None:
+            return None
+        knownHashes: dict[str, dict[str, list[int]]] = {}
+        for (jsonKey, objectId), objHash in storedHashes.items():
+            knownHashes.setdefault(jsonKey, {}).setdefault(objHash, []).append(objectId)
+        return knownHashes
+
+    def _SaveHashes(self, jsonHash: str | None, storedHashes: dict[tuple[str, int], str] | None, newHashes: list[tuple[str, str, int]]) -> None:
+        cursor = self._db.cursor()
+        if storedHashes is None:
+            cursor.execute('DELETE FROM importhashes')
+            cursor.executemany('INSERT INTO importhashes (jsonKey, hash, objectId) VALUES (?, ?, ?)', newHashes)
+        else:
+            # only write the hashes that changed, e.g. the one node an edit touched
+            current = {(jsonKey, objectId): objHash for jsonKey, objHash, objectId in newHashes}
+            cursor.executemany('DELETE FROM importhashes WHERE jsonKey = ? AND objectId = ?', [key for key in storedHashes if key not in current])
+            cursor.executemany('INSERT OR REPLACE INTO importhashes (jsonKey, hash, objectId) VALUES (?, ?, ?)',
+                               [(jsonKey, objHash, objectId) for (jsonKey, objectId), objHash in current.items()
+                                if storedHashes.get((jsonKey, objectId)) != objHash])
+        cursor.close()
+        self._SetMeta('jsonHash', jsonHash)
+
+    def _GetMeta(self, key: str) -> str | None:
+        res = self._db.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        return res[0] if res else None
+
+    def _SetMeta(self, key: str, value: str | None) -> None:
+        self._db.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (key, value))
+
+    def _Analyze(self, full: bool) -> None:
+        # refresh planner statistics so joins pick the foreign-key indexes once the tables have real sizes.  After
+        #   an incremental import the sizes have barely moved, so only let SQLite refresh what it thinks is stale, on
+        #   a sample of each index
+        if full:
+            self._db.execute('ANALYZE')
+        else:
+            self._db.execute('PRAGMA analysis_limit = 400')
+            self._db.execute('PRAGMA optimize')
+            self._db.execute('PRAGMA analysis_limit = 0')
+        self._db.commit()
+
+    @staticmethod
+    def _TopLevelTypes(supportedObjects: Iterable[Type['MapObject']]) -> list[tuple[str, Type['MapObject']]]:
+        topLevel: list[tuple[str, Type[MapObject]]] = []
         for objType in supportedObjects:
             try:
-                for jo in j[objType.JsonKey()]:
-                    o: MapObject = objType(jo, supportedObjects)
-                    o.StoreInDb(self._db)
+                topLevel.append((objType.JsonKey(), objType))
             except NotImplementedError:
                 pass
+        return topLevel
 
-        return output
+    def _NewBatch(self, supportedObjects: Iterable[Type['MapObject']], eraseExisting: bool, flushRows: int | None = None) -> 'ImportBatch':
+        if not eraseExisting:
+            parents = {}
+            for o in supportedObjects:
+                if o.Parent() is not None:
+                    column, parentType = o.Parent()
+                    parents[o.TableName()] = (column, parentType.TableName())
+            return IncrementalBatch(self._db, {o.TableName(): o.KeyColumns() for o in supportedObjects}, parents, flushRows)
+        self._DeferSearch()
+        cursor = self._db.cursor()
+        for o in supportedObjects:
+            cursor.execute(f'DELETE FROM {o.TableName()}')
+        cursor.close()
+        return ImportBatch(self._db, flushRows)
+
+    @staticmethod
+    def _ImportReport(batch: 'ImportBatch', start: float) -> list[str]:
+        elapsed = time.perf_counter() - start
+        rate = batch.rowCount / elapsed if elapsed > 0 else float('inf')
+        report = [f'INFO: Imported {batch.rowCount} rows in {elapsed:.3f} s ({rate:.0f} rows/s).']
+        if isinstance(batch, IncrementalBatch):
+            for table, counts in batch.summary.items():
+                report.append(f'INFO: {table}: {", ".join(f"{n} {change}" for change, n in counts.items())}.')
+        return report
 
     def _SetupDb(self, mapObjects: Type['MapObject']) -> None:
         cursor = self._db.cursor()
         for o in mapObjects:
             o.SetupDbTable(self._db)
+        cursor.execute('CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)')
+        self._SetupSearch(mapObjects)
+        # content hash of each top-level object from the last import and the rowid it was stored under.  They're
+        #   only good as long as nothing else writes to the map, so any write outside an import (through `Query()`,
+        #   `StoreInDb()` or another connection) throws them away, along with the whole-JSON hash
+        cursor.execute('CREATE TABLE importhashes (jsonKey TEXT NOT NULL, hash TEXT NOT NULL, objectId INTEGER NOT NULL, PRIMARY KEY (jsonKey, objectId))')
+        for o in mapObjects:
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'CREATE TRIGGER {o.TableName()}_hashes_{event.lower()} AFTER {event} ON {o.TableName()} '
+                               "WHEN NOT EXISTS (SELECT 1 FROM metadata WHERE key = 'importing') "
+                               "BEGIN DELETE FROM importhashes; DELETE FROM metadata WHERE key = 'jsonHash'; END")
+        self._SetMeta('schemaVersion', str(self._schemaVersion))
+        self._SetMeta('objectTypes', json.dumps([o.__name__ for o in mapObjects]))
         self._db.commit()
         cursor.close()
+
+    def _SetupSearch(self, mapObjects: Iterable[Type['MapObject']]) -> None:
+        # one FTS5 index over every searchable table, kept up to date by triggers so incremental imports and writes
+        #   through `Query()` stay searchable.  Index rowids interleave the tables: rowid * n + table number.  Erasing
+        #   imports defer the triggers and rebuild the index in one pass instead, see `_RebuildSearch()`
+        searchable = [o for o in mapObjects if o.SearchColumns()]
+        cursor = self._db.cursor()
+        cursor.execute('CREATE VIRTUAL TABLE search_index USING fts5(text, extra)')
+        for kind, o in enumerate(searchable):
+            table = o.TableName()
+            rowid, text, extra = self._SearchValues(o, kind, len(searchable), 'NEW.')
+            insert = f'INSERT INTO search_index (rowid, text, extra) VALUES ({rowid}, {text}, {extra});'
+            delete = f'DELETE FROM search_index WHERE rowid = OLD.rowid * {len(searchable)} + {kind};'
+            columns = ', '.join(dict.fromkeys((*o.SearchColumns(), 'extraJson')))
+            when = "WHEN NOT EXISTS (SELECT 1 FROM metadata WHERE key = 'searchDeferred')"
+            cursor.execute(f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} {when} BEGIN {insert} END')
+            cursor.execute(f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} {when} BEGIN {delete} END')
+            cursor.execute(f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF {columns} ON {table} {when} BEGIN {delete} {insert} END')
+        self._SetMeta('searchTables', json.dumps([o.TableName() for o in searchable]))
+        cursor.close()
+
+    def _DeferSearch(self) -> None:
+        # row-by-row FTS5 inserts from triggers cost an order of magnitude more than filling the index in bulk
+        self._SetMeta('searchDeferred', '1')
+        self._db.execute('DELETE FROM search_index')
+
+    def _RebuildSearch(self, supportedObjects: Iterable[Type['MapObject']]) -> None:
+        if self._GetMeta('searchDeferred') is None:
+            return
+        searchable = [o for o in supportedObjects if o.SearchColumns()]
+        cursor = self._db.cursor()
+        for kind, o in enumerate(searchable):
+            rowid, text, extra = self._SearchValues(o, kind, len(searchable), '')
+            cursor.execute(f'INSERT INTO search_index (rowid, text, extra) SELECT {rowid}, {text}, {extra} FROM {o.TableName()}')
+        cursor.execute("DELETE FROM metadata WHERE key = 'searchDeferred'")
+        cursor.close()
+
+    @staticmethod
+    def _SearchValues(o: Type['MapObject'], kind: int, kinds: int, row: str) -> tuple[str, str, str]:
+        # SQL for a row's search index entry: its rowid, its search columns, and every scalar in its extraJson with
+        #   the key it's under
+        text = 'trim(' + " || ' ' || ".join(f"coalesce({row}{c}, '')" for c in o.SearchColumns()) + ')'
+        extra = (f"CASE WHEN {row}extraJson = '{{}}' THEN NULL ELSE (SELECT group_concat(coalesce(key, '') || ' ' || atom, ' ') "
+                 f"FROM json_tree({row}extraJson) WHERE atom IS NOT NULL) END")
+        return (f'{row}rowid * {kinds} + {kind}', text, extra)
+
+    def _CheckSchema(self, dbPath: str, supportedObjects: Iterable[Type['MapObject']] | None) -> None:
+        try:
+            version = self._GetMeta('schemaVersion')
+        except sqlite3.OperationalError: # no metadata table at all, so it predates versioning
+            version = None
+        if version != str(self._schemaVersion):
+            raise ValueError(f'Map "{dbPath}" has schema version {version}, expected {self._schemaVersion}.  It needs to be rebuilt from its JSON.')
+        if supportedObjects is not None:
+            storedTypes = json.loads(self._GetMeta('objectTypes'))
+            if storedTypes != [o.__name__ for o in supportedObjects]:
+                raise ValueError(f'Map "{dbPath}" was built with object types {", ".join(storedTypes)}, not {", ".join(o.__name__ for o in supportedObjects)}.')
     
-class MapObject():
+class QueryCache:
+    """
+    LRU cache of query results keyed by (SQL, parameters), bounded both by number of entries and by the total
+    number of rows held.  Each lookup passes in the connection's `total_changes`; if it moved since the cache was
+    filled, something was written and every entry is dropped.  Writes made through other connections to the same
+    `.db` aren't seen.  Safe to share between threads.
+    """
+
+    maxEntries: int
+    maxRows: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+
+    def __init__(self, maxEntries: int = 256, maxRows: int = 100000):
+        self.maxEntries = maxEntries
+        self.maxRows = maxRows
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[tuple[str, tuple | None], list[tuple]] = OrderedDict()
+        self._rows = 0
+        self._changes: int | None = None
+        self._lock = threading.Lock()
+
+    def Get(self, q: str, values: tuple | None, changes: int) -> list[tuple] | None:
+        """Returns a copy of the cached result, or None on a miss."""
+        with self._lock:
+            self._Sync(changes)
+            try:
+                res = self._entries[(q, values)]
+            except (KeyError, TypeError): # TypeError: unhashable parameters, never cached
+                self.misses += 1
+                return None
+            self._entries.move_to_end((q, values))
+            self.hits += 1
+            return list(res)
+
+    def Put(self, q: str, values: tuple | None, res: list[tuple], changes: int) -> None:
+        with self._lock:
+            self._Sync(changes)
+            if len(res) > self.maxRows:
+                return
+            try:
+                old = self._entries.pop((q, values), None)
+            except TypeError:
+                return
+            if old is not None:
+                self._rows -= len(old)
+            self._entries[(q, values)] = list(res)
+            self._rows += len(res)
+            while len(self._entries) > self.maxEntries or self._rows > self.maxRows:
+                _, evicted = self._entries.popitem(last=False)
+                self._rows -= len(evicted)
+                self.evictions += 1
+
+    def Clear(self) -> None:
+        with self._lock:
+            self._Clear()
+
+    def _Clear(self) -> None:
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._rows = 0
+
+    def Stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'invalidations': self.invalidations,
+                'entries': len(self._entries), 'rows': self._rows}
+
+    def _Sync(self, changes: int) -> None:
+        if changes != self._changes:
+            self._Clear()
+            self._changes = changes
+
+
+class MapStats:
+    """
+    Instrumentation for a `SystemMap`, turned on with `SystemMap.EnableStats()`:
+
+    - `phases`: seconds spent per import phase: parse, hydrate, validate, store, commit and analyze.  Phases are
+      exclusive of each other, so validation isn't also counted as hydration.  When hydrating in worker processes,
+      `hydrate` is the time spent waiting on them and `validate` isn't measured.
+    - `statements`: SQL statements SQLite ran, per table (the first one a statement names) and statement kind (e.g. `['pinouts']['INSERT']`), counted
+      per row for `executemany()`.  Statements without a table (BEGIN, PRAGMA, ...) are counted under `''`.
+    - `internalStatements`: statements SQLite ran on its own behalf (traced as `-- ...`), e.g. keeping the search
+      index up to date from its triggers.  They aren't in `statements`.
+    - `commits`, and `queries`/`queryMs` for `Query()` calls.
+    - `slowQueries`: the most recent `maxSlowQueries` `Query()` calls that took at least `slowQueryMs`, as
+      `(ms, q, values)`.
+
+    Callbacks, all optional: `onStatement(sql)` for every statement counted in `statements`, `onSlowQuery(q, values, ms)`, and
+    `onImport(phases)` after each import with that import's seconds per phase.  Safe to share between threads.
+    """
+
+    slowQueryMs: float
+    maxSlowQueries: int
+    phases: dict[str, float]
+    statements: dict[str, dict[str, int]]
+    internalStatements: int
+    commits: int
+    queries: int
+    queryMs: float
+    slowQueries: deque[tuple[float, str, tuple | None]]
+
+    def __init__(self, slowQueryMs: float = 100.0, onStatement: Callable[[str], None] | None = None,
+                 onSlowQuery: Callable[[str, tuple | None, float], None] | None = None,
+                 onImport: Callable[[dict[str, float]], None] | None = None, maxSlowQueries: int = 100):
+        self.slowQueryMs = slowQueryMs
+        self.maxSlowQueries = maxSlowQueries
+        self.onStatement = onStatement
+        self.onSlowQuery = onSlowQuery
+        self.onImport = onImport
+        self._lock = threading.Lock()
+        self._prefixes: dict[str, tuple[str, str]] = {}
+        self.Reset()
+
+    def Reset(self) -> None:
+        with self._lock:
+            self.phases = {}
+            self.statements = {}
+            self.internalStatements = 0
+            self.commits = 0
+            self.queries = 0
+            self.queryMs = 0.0
+            self.slowQueries = deque(maxlen=self.maxSlowQueries)
+            self._importPhases: dict[str, float] = {}
+            self._nested = 0.0
+
+    @contextmanager
+    def Phase(self, name: str) -> Iterator[None]:
+        """Times the enclosed block as phase `name`, less any phases timed within it."""
+        start = time.perf_counter()
+        outer = self._nested
+        self._nested = 0.0
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._Add(name, elapsed - self._nested)
+            self._nested = outer + elapsed
+
+    def Report(self) -> list[str]:
+        """The stats as `INFO:` lines, like an import's output."""
+        with self._lock:
+            report = []
+            if self.phases:
+                report.append('INFO: Import phases: ' + ', '.join(f'{name} {seconds:.3f} s' for name, seconds in self.phases.items()) + '.')
+            for table, counts in sorted(self.statements.items()):
+                report.append(f'INFO: {table or "(no table)"}: ' + ', '.join(f'{n} {verb}' for verb, n in sorted(counts.items())) + '.')
+            report.append(f'INFO: {self.internalStatements} internal statements, {self.commits} commits, {self.queries} queries in {self.queryMs:.1f} ms, {len(self.slowQueries)} slow.')
+            return report
+
+    def _Nested(self, name: str, seconds: float) -> None:
+        # a phase timed inside another one without `Phase()`
+        self._Add(name, seconds)
+        self._nested += seconds
+
+    def _Add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+            self._importPhases[name] = self._importPhases.get(name, 0.0) + seconds
+
+    def _Parsing(self, elements: Iterator[any]) -> Iterator[any]:
+        # times pulling elements from a streaming parser as parse, not as whatever phase is consuming them
+        elements = iter(elements)
+        while True:
+            start = time.perf_counter()
+            try:
+                element = next(elements)
+            except StopIteration:
+                self._Nested('parse', time.perf_counter() - start)
+                return
+            self._Nested('parse', time.perf_counter() - start)
+            yield element
+
+    def _Imported(self) -> None:
+        with self._lock:
+            phases = self._importPhases
+            self._importPhases = {}
+        if self.onImport is not None:
+            self.onImport(phases)
+
+    def _Attach(self, conn: sqlite3.Connection) -> None:
+        previous = [''] # the last statement counted on `conn`
+
+        def Traced(sql: str) -> None:
+            # SQLite traces what triggers and virtual tables (e.g. the search index) run as `-- ...`, and traces the
+            #   statement that fired a trigger again as each trigger starts
+            if sql.startswith('--'):
+                with self._lock:
+                    self.internalStatements += 1
+            elif sql != previous[0] or not _TRACED_WRITE.match(sql):
+                previous[0] = sql
+                self._Traced(sql)
+        conn.set_trace_callback(Traced)
+
+    def _Traced(self, sql: str) -> None:
+        # statements arrive with their parameters filled in, but rows of the same INSERT/UPDATE/DELETE share a prefix
+        prefix = sql[:_TRACED_PREFIX]
+        traced = self._prefixes.get(prefix)
+        if traced is None:
+            m = _TRACED_STATEMENT.match(sql)
+            if m is not None:
+                traced = (next(v for v in m.groups()[:4] if v).upper(), m.group(5))
+            else:
+                traced = ((sql.split(None, 1) or [''])[0].upper(), '')
+            if (m.end() if m is not None else len(sql)) <= _TRACED_PREFIX and len(self._prefixes) < 10000:
+                self._prefixes[prefix] = traced
+        verb, table = traced
+        with self._lock:
+            counts = self.statements.get(table)
+            if counts is None:
+                counts = self.statements[table] = {}
+            counts[verb] = counts.get(verb, 0) + 1
+            if verb in ('COMMIT', 'END'):
+                self.commits += 1
+        if self.onStatement is not None:
+            self.onStatement(sql)
+
+    def _Queried(self, q: str, values: tuple | None, seconds: float) -> None:
+        ms = seconds * 1000
+        slow = ms >= self.slowQueryMs
+        with self._lock:
+            self.queries += 1
+            self.queryMs += ms
+            if slow:
+                self.slowQueries.append((ms, q, values))
+        if slow and self.onSlowQuery is not None:
+            self.onSlowQuery(q, values, ms)
+
+# the statement kind and the table it works on, for the statements that have one
+_TRACED_PREFIX = 64
+_TRACED_STATEMENT = re.compile(r'\s*(?:(INSERT|REPLACE)(?:\s+OR\s+\w+)?\s+INTO|(UPDATE)(?:\s+OR\s+\w+)?|(DELETE)\s+FROM|(SELECT)\b.*?\bFROM)'
+                               r'\s+["`\[]?(\w+)', re.IGNORECASE | re.DOTALL)
+_TRACED_WRITE = re.compile(r'\s*(?:INSERT|REPLACE|UPDATE|DELETE)\b', re.IGNORECASE)
+
+class _Instrumented(threading.local):
+    # the `MapStats` of the import running on this thread, if it's being instrumented
+    stats: MapStats | None = None
+
+_instrumented = _Instrumented()
+
+@contextmanager
+def _Phase(stats: MapStats | None, name: str) -> Iterator[None]:
+    if stats is None:
+        yield
+    else:
+        with stats.Phase(name):
+            yield
+
+
+class MapSession:
+    """
+    Reads `MapObject`s back out of a map.  Within a session each row becomes at most one live object (an identity
+    map of weak references), plain properties are filled in from the row, and relations to child objects (e.g. a
+    node's `connections`) are only queried the first time they're accessed.  Once the map has changed through its
+    writer connection the identity map starts over, since objects already handed out may no longer match.
+    """
+
+    systemMap: SystemMap
+
+    def __init__(self, systemMap: SystemMap):
+        self.systemMap = systemMap
+        self._objects: weakref.WeakValueDictionary[tuple[str, int], MapObject] = weakref.WeakValueDictionary()
+        self._changes = systemMap._db.total_changes
+        self._lock = threading.Lock()
+
+    def Get(self, objType: Type['MapObject'], rowid: int) -> 'MapObject | None':
+        """Returns the `objType` stored under `rowid`, or None if there isn't one."""
+        with self._lock:
+            self._Sync()
+            o = self._objects.get((objType.TableName(), rowid))
+        if o is not None:
+            return o
+        objects = self._Select(objType, 'rowid = ?', (rowid,))
+        return objects[0] if objects else None
+
+    def Find(self, objType: Type['MapObject'], **props: any) -> list['MapObject']:
+        """Returns every `objType` whose read-back properties equal `props`, in rowid order."""
+        plan = _ReadPlan.For(objType)
+        unknown = [prop for prop in props if prop not in plan.columns]
+        if unknown:
+            raise ValueError(f'{objType.__name__} has no readable propert{"ies" if len(unknown) > 1 else "y"} {", ".join(unknown)}.')
+        where = ' AND '.join(f'{plan.columns[prop]} IS ?' for prop in props) or '1'
+        return self._Select(objType, where, tuple(props.values()))
+
+    def _Select(self, objType: Type['MapObject'], where: str, values: tuple) -> list['MapObject']:
+        plan = _ReadPlan.For(objType)
+        rows = self.systemMap.Query(f'{plan.select} WHERE {where} ORDER BY rowid', values)
+        with self._lock:
+            self._Sync()
+            return [self._Object(plan, row) for row in rows]
+
+    def _Object(self, plan: '_ReadPlan', row: tuple) -> 'MapObject':
+        key = (plan.table, row[0])
+        o = self._objects.get(key)
+        if o is None:
+            o = plan.cls.__new__(plan.cls)
+            _readBack[o] = (self, row[0])
+            o.extraJson = json.loads(row[1]) if row[1] is not None else {}
+            for prop, value in zip(plan.props, row[2:]):
+                # SQLite has no boolean type, so those come back as 0/1
+                setattr(o, prop, bool(value) if prop in plan.boolProps and value is not None else value)
+            self._objects[key] = o
+        return o
+
+    def _LoadRelation(self, o: 'MapObject', rowid: int, name: str) -> any:
+        relation = _ReadPlan.For(type(o)).relations.get(name)
+        if relation is None:
+            raise AttributeError(f'{type(o).__name__!r} object has no attribute {name!r}')
+        childType, column, isList = relation
+        children = self._Select(childType, f'{column} = ?', (rowid,))
+        value = children if isList else (children[0] if children else None)
+        setattr(o, name, value)
+        return value
+
+    def _Sync(self) -> None:
+        changes = self.systemMap._db.total_changes
+        if changes != self._changes:
+            self._objects = weakref.WeakValueDictionary()
+            self._changes = changes
+
+# objects read back through a `MapSession` -> (session, rowid), kept off the objects so hydrated ones don't pay for it
+_readBack: 'weakref.WeakKeyDictionary[MapObject, tuple[MapSession, int]]' = weakref.WeakKeyDictionary()
+
+
+class _ExportRows:
+    """
+    One table's rows for `SystemMap.ExportJsonFile()`, read with a single query ordered the way the export walks the
+    tree: by each ancestor's rowid from the top down, then its own.  Children's `_ExportRows` are consumed in step
+    with their parent's, so each table is read exactly once.
+    """
+
+    def __init__(self, db: sqlite3.Connection, objType: Type['MapObject']):
+        self.plan = plan = _ReadPlan.For(objType)
+        self.children = {prop: _ExportRows(db, childType) for prop, (childType, _, _) in plan.relations.items()}
+        self.keys = {prop: json.dumps(objType.ExportKeys().get(prop, prop)) for prop in plan.fields}
+
+        parent = objType.Parent()
+        select = f'SELECT rowid AS _rowid, {parent[0] if parent else "NULL"} AS _parent, extraJson, {", ".join(plan.columns.values())} FROM {plan.table}'
+        # join the ancestors below the top-level one to get at their parents' rowids to sort by
+        joins: list[str] = []
+        order = ['x._rowid']
+        ref = 'x._parent'
+        while parent is not None:
+            order.insert(0, ref)
+            column, parentType = parent
+            parent = parentType.Parent()
+            if parent is not None:
+                alias = f'a{len(joins)}'
+                joins.append(f'JOIN {parentType.TableName()} {alias} ON {alias}.rowid = {ref}')
+                ref = f'{alias}.{parent[0]}'
+        self._cursor = db.execute(f'SELECT x.* FROM ({select}) AS x {" ".join(joins)} ORDER BY {", ".join(order)}')
+        self._next = self._cursor.fetchone()
+
+    def RowsOf(self, parentId: int | None) -> Iterator[tuple]:
+        """Yields the next rows, as long as they belong to `parentId` (None for top-level objects)."""
+        while self._next is not None and self._next[1] == parentId:
+            row = self._next
+            self._next = self._cursor.fetchone()
+            yield row
+
+    def Write(self, row: tuple, parts: list[str]) -> None:
+        """Appends the JSON for the object in `row`, and everything under it, to `parts`."""
+        plan = self.plan
+        values = dict(zip(plan.props, row[3:]))
+        fields = []
+        for prop in plan.fields:
+            if prop in self.children:
+                fields.append(prop)
+                continue
+            value = values[prop]
+            if prop in plan.boolProps and value is not None:
+                value = bool(value)
+            fields.append(f'{self.keys[prop]}: {json.dumps(value)}')
+        extraJson = json.loads(row[2]) if row[2] not in (None, '{}') else {}
+
+        parts.append('{')
+        for i, field in enumerate(fields):
+            if i:
+                parts.append(', ')
+            if field not in self.children:
+                parts.append(field)
+                continue
+            # a relation: nest the child rows that belong to this object
+            children = self.children[field]
+            _, _, isList = plan.relations[field]
+            parts.append(f'{self.keys[field]}: ')
+            if isList:
+                parts.append('[')
+                for j, childRow in enumerate(children.RowsOf(row[0])):
+                    if j:
+                        parts.append(', ')
+                    children.Write(childRow, parts)
+                parts.append(']')
+            else:
+                childRow = next(children.RowsOf(row[0]), None)
+                if childRow is None:
+                    parts.append('null')
+                else:
+                    children.Write(childRow, parts)
+        for key, value in extraJson.items():
+            parts.append(f'{", " if fields else ""}{json.dumps(key)}: {json.dumps(value)}')
+            fields = True
+        parts.append('}')
+
+
+class _ReadPlan:
+    """
+    What `MapSession` needs to turn a class's rows back into objects: the SELECT built from its `ReadColumns()`,
+    which properties are booleans, and which properties are relations to child objects (a `MapObject` or list of
+    them whose `Parent()` is this class).  Built once per class.
+    """
+
+    _plans: dict[type, '_ReadPlan'] = {}
+
+    def __init__(self, cls: Type['MapObject']):
+        self.cls = cls
+        self.table = cls.TableName()
+        self.columns = cls.ReadColumns()
+        self.props = tuple(self.columns)
+        self.select = f'SELECT rowid, extraJson, {", ".join(self.columns.values())} FROM {self.table}'
+        hints = get_type_hints(cls)
+        self.boolProps = frozenset(p for p in self.props if hints[p] is bool or bool in get_args(hints[p]))
+        self.relations: dict[str, tuple[Type[MapObject], str, bool]] = {}
+        for prop, t in hints.items():
+            isList = get_origin(t) is list
+            memberType = get_args(t)[0] if isList else t
+            if isinstance(memberType, type) and issubclass(memberType, MapObject):
+                parent = memberType.Parent()
+                if parent is not None and parent[1] is cls:
+                    self.relations[prop] = (memberType, parent[0], isList)
+        # everything that can be read back, in declaration order
+        self.fields = tuple(prop for prop in hints if prop in self.columns or prop in self.relations)
+
+    @classmethod
+    def For(cls, objType: Type['MapObject']) -> '_ReadPlan':
+        try:
+            return cls._plans[objType]
+        except KeyError:
+            plan = cls._plans[objType] = _ReadPlan(objType)
+            return plan
+
+
+def _ExtendColumn(column: array.array | list, values: tuple) -> array.array | list:
+    # columns start out as int64 and get widened to float64, then to a list, as values that don't fit turn up
+    if type(column) is array.array:
+        n = len(column)
+        try:
+            column.extend(values)
+            return column
+        except (TypeError, OverflowError):
+            del column[n:]
+        if column.typecode == 'q' and all(type(v) in (int, float) for v in values):
+            return _ExtendColumn(array.array('d', column), values)
+        column = column.tolist()
+    column.extend(values)
+    return column
+
+def _FinishColumn(column: array.array | list) -> any:
+    if numpy is None:
+        return column
+    if type(column) is array.array:
+        return numpy.frombuffer(column, dtype=numpy.int64 if column.typecode == 'q' else numpy.float64)
+    return numpy.array(column, dtype=object)
+
+
+def _WithJsonPath(e: Exception, step: str) -> Exception:
+    """
+    Rebuilds an error raised while hydrating or storing the JSON at `step` so its message leads with the JSON path
+    of the offending object (e.g. `nodes[12].connections[3]: ...`).  Outer steps are prefixed as it propagates.
+    """
+    inner = getattr(e, 'jsonPath', None)
+    path = step if inner is None else f'{step}.{inner}'
+    message = getattr(e, 'jsonMessage', str(e))
+    try:
+        wrapped = type(e)(f'{path}: {message}')
+    except TypeError: # an exception type that doesn't take just a message, leave it be
+        return e
+    wrapped.jsonPath, wrapped.jsonMessage = path, message
+    return wrapped.with_traceback(e.__traceback__)
+
+class _Ref:
+    """Placeholder a `RecordingBatch` hands out instead of a rowid: the index of the operation that produces it."""
+    __slots__ = ('op',)
+
+    def __init__(self, op: int):
+        self.op = op
+
+class RecordingBatch:
+    """
+    Stands in for an `ImportBatch` where there is no database, i.e. in the worker processes of a parallel import.
+    `Insert()` and `Lookup()` only record the operation in `ops` and return a `_Ref` to it; `_Replay()` then
+    runs them against the real batch.  Lookups always appear to succeed here, so misses are dealt with there.
+
+    Ops are recorded as `(isInsert, table, columns, values, refs)`, where the `values` at the positions in `refs`
+    are op indexes rather than `_Ref`s, so they pickle as plain tuples on the way back from the worker.
+    """
+
+    ops: list[tuple[bool, str, tuple[str, ...], tuple, tuple[int, ...]]]
+
+    def __init__(self):
+        self.ops = []
+
+    def Insert(self, table: str, columns: tuple[str, ...], values: tuple) -> _Ref:
+        return self._Record(True, table, columns, values)
+
+    def Lookup(self, table: str, keyColumns: tuple[str, ...], key: tuple) -> _Ref:
+        return self._Record(False, table, keyColumns, key)
+
+    def _Record(self, isInsert: bool, table: str, columns: tuple[str, ...], values: tuple) -> _Ref:
+        refs = tuple(i for i, v in enumerate(values) if type(v) is _Ref)
+        if refs:
+            values = tuple(v.op if type(v) is _Ref else v for v in values)
+        self.ops.append((isInsert, table, columns, values, refs))
+        return _Ref(len(self.ops) - 1)
+
+def _HydrateChunk(jsonKey: str, objType: Type['MapObject'], supportedObjects: tuple[Type['MapObject'], ...],
+                  elements: list[tuple[int, dict[str, any]]]) -> list[tuple[list[tuple], int | None, any]]:
+    """Worker half of a parallel import: hydrates and validates top-level objects, returning what storing each one records."""
+    recorded = []
+    for i, jo in elements:
+        batch = RecordingBatch()
+        try:
+            returned = objType(jo, supportedObjects).StoreInBatch(batch)
+        except (TypeError, ValueError) as e:
+            raise _WithJsonPath(e, f'{jsonKey}[{i}]') from None
+        # the stored object's rowid, as the op that produces it or as whatever StoreInBatch() returned
+        if type(returned) is _Ref:
+            recorded.append((batch.ops, returned.op, None))
+        else:
+            recorded.append((batch.ops, None, returned))
+    return recorded
+
+def _Replay(batch: 'ImportBatch', ops: list[tuple[bool, str, tuple[str, ...], tuple, tuple[int, ...]]], returnedOp: int | None,
+            returned: any) -> int | None:
+    """
+    Runs the operations a `RecordingBatch` recorded against `batch` and returns the stored object's rowid.  Lookups
+    that don't depend on the object's own rows are resolved first, so if one misses nothing has been queued yet
+    and None is returned: the caller then stores the object itself and gets the model's own error (or handling).
+    """
+    results: list[int | None] = [None] * len(ops)
+    deferred: list[int] = []
+    deferredOps: set[int] = set()
+    insertedTables: set[str] = set()
+    for n, (isInsert, table, columns, values, refs) in enumerate(ops):
+        if isInsert or table in insertedTables or any(values[i] in deferredOps for i in refs):
+            deferred.append(n)
+            deferredOps.add(n)
+            if isInsert:
+                insertedTables.add(table)
+            continue
+        results[n] = batch.Lookup(table, columns, _Resolved(values, refs, results))
+        if results[n] is None:
+            return None
+    for n in deferred:
+        isInsert, table, columns, values, refs = ops[n]
+        values = _Resolved(values, refs, results)
+        if isInsert:
+            results[n] = batch.Insert(table, columns, values)
+        else:
+            results[n] = batch.Lookup(table, columns, values)
+            if results[n] is None:
+                raise ValueError(f'No "{table}" row with ({", ".join(columns)}) = {values}.')
+    return results[returnedOp] if returnedOp is not None else returned
+
+def _Resolved(values: tuple, refs: tuple[int, ...], results: list[int | None]) -> tuple:
+    if not refs:
+        return values
+    resolved = list(values)
+    for i in refs:
+        resolved[i] = results[values[i]]
+    return tuple(resolved)
+
+
+class ImportBatch:
+    """
+    Collects rows per table during an import so each table is written with one `executemany()` per flush.
+    Row ids are handed out up front, so children can reference parents that have not been written yet, and
+    foreign keys are resolved through in-memory indexes via `Lookup()` rather than per-row SELECTs.  If
+    `flushRows` is given, queued rows are written whenever that many are pending so memory stays bounded.
+    Nothing is committed here; the caller owns the transaction.
+    """
+
+    dbConnection: sqlite3.Connection
+    rowCount: int
+
+    def __init__(self, dbConnection: sqlite3.Connection, flushRows: int | None = None):
+        self.dbConnection = dbConnection
+        self.rowCount = 0
+        self._flushRows = flushRows
+        self._pendingCount = 0
+        self._pending: dict[tuple[str, tuple[str, ...]], list[tuple]] = {}
+        self._nextId: dict[str, int] = {}
+        self._indexes: dict[str, dict[tuple[str, ...], dict[tuple, int]]] = {}
+
+    def Insert(self, table: str, columns: tuple[str, ...], values: tuple) -> int:
+        """Queues a row for insertion into `table` and returns the rowid it will be stored under."""
+        if table not in self._nextId:
+            cursor = self.dbConnection.cursor()
+            cursor.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM {table}')
+            self._nextId[table] = cursor.fetchone()[0] + 1
+            cursor.close()
+        rowid = self._nextId[table]
+        self._nextId[table] += 1
+        self._pending.setdefault((table, columns), []).append((rowid, *values))
+        self.rowCount += 1
+        self._Indexed(table, columns, values, rowid)
+        self._Queued()
+        return rowid
+
+    def Lookup(self, table: str, keyColumns: tuple[str, ...], key: tuple) -> int | None:
+        """Returns the rowid of the row in `table` whose `keyColumns` equal `key`, or None if there is none."""
+        tableIndexes = self._indexes.setdefault(table, {})
+        index = tableIndexes.get(keyColumns)
+        if index is None:
+            index = tableIndexes[keyColumns] = self._LoadIndex(table, keyColumns)
+        return index.get(key)
+
+    def Value(self, table: str, column: str, rowid: int) -> any:
+        """`column` of the row in `table` stored (or queued) under `rowid`.  Scans the queued rows, so meant for error messages."""
+        for (pendingTable, columns), rows in self._pending.items():
+            if pendingTable == table and column in columns:
+                position = columns.index(column) + 1
+                for row in rows:
+                    if row[0] == rowid:
+                        return row[position]
+        cursor = self.dbConnection.cursor()
+        cursor.execute(f'SELECT {column} FROM {table} WHERE rowid = ?', (rowid,))
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row is not None else None
+
+    def _Indexed(self, table: str, columns: tuple[str, ...], values: tuple, rowid: int) -> None:
+        for keyColumns, index in self._indexes.get(table, {}).items():
+            index[tuple(values[columns.index(c)] for c in keyColumns)] = rowid
+
+    def _Queued(self) -> None:
+        self._pendingCount += 1
+        if self._flushRows is not None and self._pendingCount >= self._flushRows:
+            self.Flush()
+
+    def _LoadIndex(self, table: str, keyColumns: tuple[str, ...]) -> dict[tuple, int]:
+        # rows already in the database...
+        cursor = self.dbConnection.cursor()
+        cursor.execute(f'SELECT rowid, {", ".join(keyColumns)} FROM {table}')
+        index = {tuple(row[1:]): row[0] for row in cursor}
+        cursor.close()
+        # ...plus the ones still waiting to be flushed
+        for (pendingTable, columns), rows in self._pending.items():
+            if pendingTable == table:
+                positions = [columns.index(c) + 1 for c in keyColumns]
+                for row in rows:
+                    index[tuple(row[i] for i in positions)] = row[0]
+        return index
+
+    def Flush(self) -> None:
+        """Writes all queued rows, tables in the order they were first seen (i.e. parents before children)."""
+        cursor = self.dbConnection.cursor()
+        for (table, columns), rows in self._pending.items():
+            if rows:
+                placeholders = ', '.join('?' * (len(columns) + 1))
+                cursor.executemany(f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES ({placeholders})', rows)
+                rows.clear()
+        self._pendingCount = 0
+        cursor.close()
+
+    def Finish(self) -> None:
+        """Writes everything still queued once the import is complete."""
+        self.Flush()
+
+
+class IncrementalBatch(ImportBatch):
+    """
+    An `ImportBatch` that diffs an import against the rows already in the database instead of appending to them.
+    Rows are matched by natural key (`keyColumns` per table, plus a running count so duplicate keys pair up in
+    rowid order).  Matched rows keep their rowid and are only updated if a value changed, new rows are inserted,
+    and `Finish()` deletes every existing row the import didn't mention.  `summary` counts what happened per table.
+
+    Existing children are only read for parents the import actually matched (`parents` maps each child table to
+    its `(column, parent table)`), so subtrees handed to `Keep()` are never loaded or touched.
+    """
+
+    summary: dict[str, dict[str, int]]
+
+    def __init__(self, dbConnection: sqlite3.Connection, keyColumns: dict[str, tuple[str, ...]], parents: dict[str, tuple[str, str]],
+                 flushRows: int | None = None):
+        super().__init__(dbConnection, flushRows)
+        self._keyColumns = keyColumns
+        self._parents = parents
+        self._existing: dict[str, dict[tuple, tuple[int, tuple]]] = {}
+        self._existingCounts: dict[str, dict[tuple, int]] = {}
+        self._existingKeys: dict[str, dict[int, tuple]] = {} # top-level tables: rowid -> key in `_existing`
+        self._loadedTables: set[str] = set()
+        self._loadedParents: dict[str, set[int]] = {}
+        self._matched: dict[str, set[int]] = {}
+        self._kept: dict[str, set[int]] = {}
+        self._occurrences: dict[str, dict[tuple, int]] = {}
+        self._pendingUpdates: dict[tuple[str, tuple[str, ...]], list[tuple]] = {}
+        self.summary = {table: {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0} for table in keyColumns}
+
+    def Insert(self, table: str, columns: tuple[str, ...], values: tuple) -> int:
+        """Matches the row against the existing ones and returns the rowid it will be stored under."""
+        # register the table with the flush order even if this row turns out not to need inserting
+        self._pending.setdefault((table, columns), [])
+        existing = self._Existing(table, columns, values)
+        key = tuple(values[columns.index(c)] for c in self._keyColumns[table])
+        n = self._Occurred(table, key)
+        match = existing.pop((*key, n), None)
+        if match is not None and table in self._existingKeys:
+            del self._existingKeys[table][match[0]]
+        if match is None:
+            self.summary[table]['inserted'] += 1
+            return super().Insert(table, columns, values)
+
+        rowid, oldValues = match
+        if oldValues == tuple(values):
+            self.summary[table]['unchanged'] += 1
+        else:
+            self.summary[table]['updated'] += 1
+            self._pendingUpdates.setdefault((table, columns), []).append((*values, rowid))
+            self._Queued()
+        self.rowCount += 1
+        self._matched.setdefault(table, set()).add(rowid)
+        self._Indexed(table, columns, values, rowid)
+        return rowid
+
+    def Keep(self, table: str, rowid: int) -> bool:
+        """
+        Marks an existing top-level row and everything under it as unchanged without it being re-stored.  Returns
+        False if the import already matched another object to that row (one with the same key, earlier in the JSON),
+        in which case the object has to be stored like any other.
+        """
+        if rowid in self._matched.get(table, ()):
+            return False
+        self._kept.setdefault(table, set()).add(rowid)
+        self.summary[table]['unchanged'] += 1
+        # the row's key is taken, so a later object with the same key pairs up with the next existing row, if any
+        key = self._existingKeys.get(table, {}).pop(rowid, None)
+        if key is not None:
+            del self._existing[table][key]
+            self._Occurred(table, key[:-1])
+        return True
+
+    def _Occurred(self, table: str, key: tuple) -> int:
+        # which occurrence of `key` in the import this is
+        occurrences = self._occurrences.setdefault(table, {})
+        n = occurrences[key] = occurrences.get(key, 0) + 1
+        return n
+
+    def Flush(self) -> None:
+        super().Flush()
+        cursor = self.dbConnection.cursor()
+        for (table, columns), rows in self._pendingUpdates.items():
+            if rows:
+                cursor.executemany(f'UPDATE {table} SET {", ".join(f"{c} = ?" for c in columns)} WHERE rowid = ?', rows)
+                rows.clear()
+        cursor.close()
+
+    def Finish(self) -> None:
+        """Flushes and deletes the existing rows that weren't matched.  Their children go with them without being counted."""
+        self.Flush()
+        cursor = self.dbConnection.cursor()
+        for table in self._keyColumns:
+            stale = [rowid for rowid, _ in self._existing.get(table, {}).values()]
+            if table not in self._parents:
+                if table not in self._loadedTables:
+                    cursor.execute(f'SELECT rowid FROM {table}')
+                    stale = [rowid for rowid, in cursor]
+                kept = self._kept.get(table, set())
+                stale = [rowid for rowid in stale if rowid not in kept]
+            else:
+                # matched parents that got no children of this kind in the import lose all of their existing ones
+                column, parentTable = self._parents[table]
+                for parentId in self._matched.get(parentTable, set()) - self._loadedParents.get(table, set()):
+                    cursor.execute(f'SELECT rowid FROM {table} WHERE {column} = ?', (parentId,))
+                    stale.extend(rowid for rowid, in cursor)
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = ?', [(rowid,) for rowid in stale])
+            self.summary[table]['deleted'] += len(stale)
+        cursor.close()
+
+    def _Existing(self, table: str, columns: tuple[str, ...], values: tuple) -> dict[tuple, tuple[int, tuple]]:
+        existing = self._existing.setdefault(table, {})
+        if table not in self._parents:
+            if table in self._loadedTables:
+                return existing
+            self._loadedTables.add(table)
+            where, params = '', ()
+        else:
+            # only a parent that matched an existing row can have existing children
+            column, parentTable = self._parents[table]
+            parentId = values[columns.index(column)]
+            loaded = self._loadedParents.setdefault(table, set())
+            if parentId in loaded or parentId not in self._matched.get(parentTable, ()):
+                return existing
+            loaded.add(parentId)
+            where, params = f' WHERE {column} = ?', (parentId,)
+
+        keyPositions = [columns.index(c) for c in self._keyColumns[table]]
+        counts = self._existingCounts.setdefault(table, {})
+        kept = self._kept.get(table, ())
+        existingKeys = self._existingKeys.setdefault(table, {}) if table not in self._parents else None
+        cursor = self.dbConnection.cursor()
+        cursor.execute(f'SELECT rowid, {", ".join(columns)} FROM {table}{where} ORDER BY rowid', params)
+        for row in cursor:
+            rowValues = row[1:]
+            key = tuple(rowValues[i] for i in keyPositions)
+            n = counts[key] = counts.get(key, 0) + 1
+            if row[0] in kept:
+                # already kept by the import (so not up for matching), but its key counts as taken
+                self._Occurred(table, key)
+            else:
+                existing[(*key, n)] = (row[0], rowValues)
+                if existingKeys is not None:
+                    existingKeys[row[0]] = (*key, n)
+        cursor.close()
+        return existing
+
+    def _LoadIndex(self, table: str, keyColumns: tuple[str, ...]) -> dict[tuple, int]:
+        # existing rows only count as lookup targets once the import has matched or kept them
+        index = super()._LoadIndex(table, keyColumns)
+        kept = self._kept.get(table, set())
+        if table not in self._parents and table not in self._loadedTables:
+            return {key: rowid for key, rowid in index.items() if rowid in kept}
+        stale = {rowid for rowid, _ in self._existing.get(table, {}).values()} - kept
+        return {key: rowid for key, rowid in index.items() if rowid not in stale}
+
+
+class _HydrationPlan:
+    """
+    Everything `MapObject.__init__` needs to know about a class that doesn't depend on the instance: resolved
+    type hints, how each incoming JSON key maps onto a property, which properties hold nested `MapObject`s, which
+    ones may be left null, and a validator compiled from the hints that checks every property of a freshly loaded
+    object in one call.  Built once per class (and set of recognized members) and then reused.
+    """
+
+    types: dict[str, type]
+    required: tuple[str, ...]
+    defaults: tuple[tuple[str, any, Callable[[any], any] | None], ...]
+    valid: Callable[['MapObject'], bool]
+
+    def __init__(self, cls: Type['MapObject'], recognizedMembers: Iterable[Type['MapObject']]):
+        # get list of properties in this object (members declared on MapObject itself aren't loaded from JSON)
+        baseProps = MapObject.__annotations__.keys()
+        self.types = {prop: t for prop, t in get_type_hints(cls).items() if prop not in baseProps}
+        self._memberTypes = {t: t for t in recognizedMembers}
+        self._memberLists = {list[t]: t for t in recognizedMembers}
+        self._keys: dict[str, tuple[str | None, Type['MapObject'] | None, bool]] = {}
+
+        # figure out which properties must be supplied
+        self.required = tuple(prop for prop, t in self.types.items() if not _Nullable(t))
+
+        # what every instance starts out with: its class defaults (mutable ones copied per instance), or None for
+        #   properties that may be left null
+        defaults = dict.fromkeys((prop for prop in self.types if prop not in self.required), None)
+        defaults.update(cls._defaults)
+        self.defaults = tuple((prop, value, _Copier(value)) for prop, value in defaults.items())
+
+        # compile the hints into one check over all properties.  Nested members were built (and checked) by their
+        #   own class, so they only need to be present if required; everything else is checked against its hint
+        namespace: dict[str, any] = {}
+        self._checks: dict[str, Callable[[any], bool]] = {}
+        lines = []
+        for prop, t in self.types.items():
+            if t in self._memberTypes or t in self._memberLists:
+                expression = 'v is not None' if prop in self.required else None
+            else:
+                expression = _CheckExpression(t, 'v', namespace)
+                self._checks[prop] = eval(f'lambda v: {expression}', namespace)
+            if expression is not None and expression != 'True':
+                lines.append(f'        v = o.{prop}\n        if not ({expression}):\n            return False\n')
+        # a required property that was never supplied is an unset slot, hence the AttributeError
+        source = f'def Valid(o):\n    try:\n{"".join(lines)}    except AttributeError:\n        return False\n    return True\n'
+        exec(source, namespace)
+        self.valid = namespace['Valid']
+
+    def Invalid(self, o: 'MapObject', jsonDict: dict[str, any]) -> TypeError:
+        """Describes why `valid(o)` failed for an object loaded from `jsonDict`: the first mistyped key, or what's missing."""
+        for key, incVal in jsonDict.items():
+            incProp, memberType, _ = self.Resolve(key)
+            if incProp is not None and memberType is None and not self._checks[incProp](incVal):
+                return TypeError(f'Incoming JSON "{key}" must contain "{self.types[incProp]}", {type(incVal)} not allowed.')
+        missingProps = [p for p in self.required if getattr(o, p, None) is None]
+        missingStr = ', '.join([f'"{p}"' for p in missingProps])
+        return TypeError(f'Incoming JSON missing required key{"s" if len(missingProps) > 1 else ""}: {missingStr}')
+
+    def Resolve(self, key: str) -> tuple[str | None, Type['MapObject'] | None, bool]:
+        """
+        Maps an incoming JSON key onto `(property, memberType, isList)`.  `property` is None for keys that belong
+        in `extraJson`; `memberType` is None for plain values.
+        """
+        try:
+            return self._keys[key]
+        except KeyError:
+            pass
+        incProp = re.sub(r'([a-zA-Z])[\s,.]+([a-zA-Z])', lambda m : m.group(1) + m.group(2).capitalize(), key)
+        if incProp not in self.types:
+            resolved = (None, None, False)
+        elif self.types[incProp] in self._memberTypes:
+            resolved = (incProp, self._memberTypes[self.types[incProp]], False)
+        elif self.types[incProp] in self._memberLists:
+            resolved = (incProp, self._memberLists[self.types[incProp]], True)
+        else:
+            resolved = (incProp, None, False)
+        self._keys[key] = resolved
+        return resolved
+
+
+def _Nullable(t: any) -> bool:
+    return t in (Any, any, None, type(None)) or _NonNull(t)[1]
+
+def _CheckExpression(t: any, var: str, namespace: dict[str, any]) -> str:
+    """
+    Python source for an expression that is true when `var` holds a value matching type hint `t`.  Classes it
+    refers to are added to `namespace` (which the expression is later compiled in) under generated names.
+    """
+    if t in (Any, any):
+        return 'True'
+    if t is None or t is type(None):
+        return f'{var} is None'
+    origin = get_origin(t)
+    if origin in (Union, types.UnionType):
+        args = get_args(t)
+        # plain classes collapse into a single isinstance() against a tuple
+        classes = tuple(a for a in args if a is not type(None) and get_origin(a) is None and isinstance(a, type))
+        parts = [f'{var} is None'] if type(None) in args else []
+        if classes:
+            parts.append(_IsInstance(var, classes, namespace))
+        parts.extend(_CheckExpression(a, var, namespace) for a in args if a is not type(None) and a not in classes)
+        return f'({" or ".join(parts)})'
+    if origin in (list, set, frozenset) or (origin is tuple and len(get_args(t)) == 2 and get_args(t)[1] is ...):
+        item = _CheckExpression(get_args(t)[0], f'{var}_', namespace) if get_args(t) else 'True'
+        isinstanceCheck = _IsInstance(var, origin, namespace)
+        return isinstanceCheck if item == 'True' else f'({isinstanceCheck} and all({item} for {var}_ in {var}))'
+    if origin is dict:
+        keyType, valueType = get_args(t) or (Any, Any)
+        key, value = _CheckExpression(keyType, f'{var}_k', namespace), _CheckExpression(valueType, f'{var}_v', namespace)
+        isinstanceCheck = _IsInstance(var, dict, namespace)
+        if key == value == 'True':
+            return isinstanceCheck
+        return f'({isinstanceCheck} and all({key} and {value} for {var}_k, {var}_v in {var}.items()))'
+    if origin is not None:
+        return _IsInstance(var, origin, namespace)
+    if isinstance(t, type):
+        return _IsInstance(var, t, namespace)
+    raise TypeError(f'Can\'t validate against type hint "{t}".')
+
+def _IsInstance(var: str, classes: type | tuple[type, ...], namespace: dict[str, any]) -> str:
+    name = f'_t{len(namespace)}'
+    namespace[name] = classes
+    return f'isinstance({var}, {name})'
+
+def _Copier(value: any) -> Callable[[any], any] | None:
+    """How a default gets copied for each new instance: not at all if it's immutable, shallowly otherwise."""
+    if type(value) in (type(None), bool, int, float, str, bytes, tuple, frozenset):
+        return None
+    elif type(value) in (list, dict, set):
+        return type(value)
+    return copy.copy
+
+class _TablePlan:
+    """
+    How a class's objects are laid out in its table, derived from its type hints, `Parent()` and `References()`:
+    the DDL, the column tuple its rows are inserted with (plain properties, parent key, references, extraJson) and
+    which properties hold members to store beneath it.  Built once per class.
+    """
+
+    _plans: dict[type, '_TablePlan'] = {}
+
+    def __init__(self, cls: Type['MapObject']):
+        self.table = cls.TableName()
+        baseProps = MapObject.__annotations__.keys()
+        columnNames = cls.ColumnNames()
+        references = cls.References()
+        parent = cls.Parent()
+        self.parentColumn = parent[0] if parent is not None else None
+        self.values: list[tuple[str, str]] = [] # (property, column)
+        self.references: list[tuple[str, str, Type[MapObject], str, tuple[str, ...]]] = [] # (property, column, type, table, key columns)
+        self.members: list[tuple[str, bool, str]] = [] # (property, isList, JSON key)
+        definitions = ['rowid INTEGER PRIMARY KEY']
+        if parent is not None:
+            definitions.append(f'{parent[0]} INTEGER NOT NULL REFERENCES {parent[1].TableName()}(rowid) ON DELETE CASCADE')
+        for prop, t in get_type_hints(cls).items():
+            if prop in baseProps:
+                continue
+            t, nullable = _NonNull(t)
+            isList = get_origin(t) is list
+            memberType = get_args(t)[0] if isList else t
+            if isinstance(memberType, type) and issubclass(memberType, MapObject):
+                self.members.append((prop, isList, cls.ExportKeys().get(prop, prop)))
+                continue
+            column = columnNames.get(prop, prop)
+            constraint = '' if nullable else ' NOT NULL'
+            if prop in references:
+                refType, keyColumns = references[prop]
+                definitions.append(f'{column} INTEGER{constraint} REFERENCES {refType.TableName()}(rowid) ON DELETE CASCADE')
+                self.references.append((prop, column, refType, refType.TableName(), keyColumns))
+            elif t in _SQL_TYPES:
+                definitions.append(f'{column} {_SQL_TYPES[t]}{constraint}')
+                self.values.append((prop, column))
+            else:
+                raise TypeError(f'{cls.__name__}.{prop}: no column type for "{t}"; store it in `extraJson` or reference another object.')
+        definitions.append('extraJson TEXT')
+        if cls.Unique():
+            definitions.append(f'CONSTRAINT unique_{self.table} UNIQUE ({", ".join(cls.KeyColumns())})')
+        self.ddl = f'CREATE TABLE {self.table} ({", ".join(definitions)})'
+        self.props = tuple(prop for prop, _ in self.values)
+        self.columns = tuple(c for _, c in self.values) + ((self.parentColumn,) if parent is not None else ()) + \
+                       tuple(c for _, c, _, _, _ in self.references) + ('extraJson',)
+
+        # every foreign key gets an index led by it (and followed by the others, which is what joins and the
+        #   incremental diff filter on), unless the UNIQUE constraint already starts with it
+        foreignKeys = ((self.parentColumn,) if parent is not None else ()) + tuple(c for _, c, _, _, _ in self.references)
+        uniquePrefix = cls.KeyColumns()[0] if cls.Unique() else None
+        self.indexes = [f'CREATE INDEX {self.table}_by_{fk} ON {self.table} ({", ".join((fk,) + tuple(c for c in foreignKeys if c != fk))})'
+                        for fk in foreignKeys if fk != uniquePrefix]
+
+    @classmethod
+    def For(cls, objType: Type['MapObject']) -> '_TablePlan':
+        try:
+            return cls._plans[objType]
+        except KeyError:
+            plan = cls._plans[objType] = _TablePlan(objType)
+            return plan
+
+_SQL_TYPES = {str: 'TEXT', int: 'INTEGER', float: 'REAL', bool: 'BOOLEAN'}
+
+def _MissingReference(o: 'MapObject', batch: 'ImportBatch', plan: _TablePlan, refType: Type['MapObject'], keyColumns: tuple[str, ...],
+                      key: tuple) -> ValueError:
+    """The error for a reference that doesn't resolve, e.g. `Net "X" for PinMap (pin "7") does not exist on bus "Encoder".`"""
+    # name the object by whichever of its key columns are plain properties...
+    props = {column: prop for prop, column in plan.values}
+    names = [f'{props[c]} "{getattr(o, props[c])}"' for c in type(o).KeyColumns() if c in props and getattr(o, props[c]) is not None]
+    owner = f'{type(o).__name__} ({", ".join(names)})' if names else type(o).__name__
+    # ...and the key columns taken from its parent by what they point at
+    refPlan = _TablePlan.For(refType)
+    scopeTypes = {column: t for _, column, t, _, _ in refPlan.references}
+    if refPlan.parentColumn is not None:
+        scopeTypes[refPlan.parentColumn] = refType.Parent()[1]
+    scopes = []
+    for column, value in zip(keyColumns[:-1], key):
+        scopeType = scopeTypes.get(column)
+        if scopeType is not None:
+            value = batch.Value(scopeType.TableName(), scopeType.KeyColumns()[-1], value)
+        scopes.append(f'{column} "{value}"')
+    return ValueError(f'{refType.__name__} "{key[-1]}" for {owner} does not exist{" on " + " and ".join(scopes) if scopes else ""}.')
+
+def _ParentRow(dbConnection: sqlite3.Connection, cls: Type['MapObject'], parentId: int | None) -> dict[str, any] | None:
+    """The stored values, by column, of the object `cls` is stored under, if any of its `References()` need them."""
+    plan = _TablePlan.For(cls)
+    if parentId is None or not any(len(keyColumns) > 1 for _, _, _, _, keyColumns in plan.references):
+        return None
+    parentTable = cls.Parent()[1].TableName()
+    cursor = dbConnection.cursor()
+    cursor.execute(f'SELECT * FROM {parentTable} WHERE rowid = ?', (parentId,))
+    row = cursor.fetchone()
+    columns = [d[0] for d in cursor.description]
+    cursor.close()
+    if row is None:
+        raise ValueError(f'No "{parentTable}" row with rowid {parentId} to store {cls.__name__} under.')
+    return dict(zip(columns, row))
+
+def _NonNull(t: any) -> tuple[any, bool]:
+    """Strips `None` from an optional type hint, returning the remaining type and whether `None` was allowed."""
+    if get_origin(t) in (Union, types.UnionType):
+        args = tuple(a for a in get_args(t) if a is not type(None))
+        if len(args) < len(get_args(t)):
+            return (args[0] if len(args) == 1 else Union[args], True)
+    return (t, False)
+
+class _MapObjectType(type):
+    """
+    Metaclass for `MapObject`s: gives each class `__slots__` for the properties its own type hints declare, so
+    instances carry no `__dict__`.  A class-level default can't share its name with a slot, so defaults are moved
+    into `_defaults` (merged with the base classes' ones) and `MapObject.__init__` assigns them per instance.
+    Classes that declare `__slots__` themselves are left alone.
+    """
+
+    def __new__(mcls, name: str, bases: tuple[type, ...], namespace: dict[str, any]):
+        if '__slots__' not in namespace:
+            inherited = {slot for base in bases for c in base.__mro__ for slot in getattr(c, '__slots__', ())}
+            slots = tuple(prop for prop, t in namespace.get('__annotations__', {}).items() if prop not in inherited and not _IsClassVar(t))
+            if not any(hasattr(base, '__weakref__') for base in bases):
+                slots += ('__weakref__',) # so `MapSession` can keep weak references
+            defaults: dict[str, any] = {}
+            for base in reversed(bases):
+                defaults.update(getattr(base, '_defaults', {}))
+            defaults.update((prop, namespace.pop(prop)) for prop in slots if prop in namespace)
+            namespace['__slots__'] = slots
+            namespace['_defaults'] = defaults
+        return super().__new__(mcls, name, bases, namespace)
+
+def _IsClassVar(t: any) -> bool:
+    if isinstance(t, str): # postponed annotations
+        return t.startswith(('ClassVar', 'typing.ClassVar'))
+    return t is ClassVar or get_origin(t) is ClassVar
+
+
+class MapObject(metaclass=_MapObjectType):
     extraJson: dict[str, any] = {}
+    _defaults: ClassVar[dict[str, any]]
+    _hydrationPlans: ClassVar[dict[tuple[type, frozenset], _HydrationPlan]] = {}
+
     def __init__(self, jsonDict: dict[str, any], recognizedMembers: Iterable[Type['MapObject']]):
         '''
         Base class for members in a system map.  
         '''
         # TODO make sure all recognizedMembers are our children (or is that ok if they're not?)
-        # get list of properties in this object
-        myTypes = get_type_hints(self)
-        # myProps = [attr for attr in dir(self) if not callable(getattr(self, attr)) and not attr.startswith("__")]
-        # ^ this doesn't work because dir() doesn't list properties that were only type hinted and not assigned a value
-        myProps = myTypes.keys()
-        
+        plan = type(self)._Plan(recognizedMembers)
+        for prop, value, copier in plan.defaults:
+            # mutable defaults (e.g. `extraJson` or an empty member list) get copied so no two objects share one
+            setattr(self, prop, value if copier is None else copier(value))
+
         # load in all the keys we're getting
-        for key in jsonDict.keys():
-            incProp = re.sub(r'([a-zA-Z])[\s,.]+([a-zA-Z])', lambda m : m.group(1) + m.group(2).capitalize(), key)
-            incVal = jsonDict[key]
-            # see if the key matches any of our properties
-            if incProp in myProps:
-                # first, check if our prop is a special type
-                if myTypes[incProp] in recognizedMembers:
-                    # instantiate a new object of that type for the member and hand it the json contents we are looking at
-                    self.__setattr__(incProp, globals()[myTypes[incProp]](incVal, recognizedMembers))
-                # ... or if it is a list of a special type
-                elif myTypes[incProp] in [list[t] for t in recognizedMembers]:
-                    if incVal is not None:
-                        self.__setattr__(incProp, [myTypes[incProp].__args__[0](v, recognizedMembers) for v in incVal])
-                # finally, check if incoming value matches the expected type (which should be a basic type if we got here)
-                #    TODO this will fail with a parameterized generic type hint that doesn't get caught above because type hints are a janky, bolted-on idiotic mess
-                elif isinstance(incVal, myTypes[incProp]):
-                    # easy to handle, assign the value to our property
-                    self.__setattr__(incProp, incVal)
-                # if it's something else, yell about it
-                else:
-                    raise TypeError(f'Incoming JSON "{key}" must contain "{myTypes[key]}", {type(incVal)} not allowed.')
+        for key, incVal in jsonDict.items():
+            incProp, memberType, isList = plan.Resolve(key)
             # put any unexpected keys and their contents in the extraJson dict
-            else:
+            if incProp is None:
                 self.extraJson[key] = incVal
+            # first, check if our prop is a special type
+            elif memberType is not None and not isList:
+                # instantiate a new object of that type for the member and hand it the json contents we are looking at
+                try:
+                    self.__setattr__(incProp, memberType(incVal, recognizedMembers))
+                except (TypeError, ValueError) as e:
+                    raise _WithJsonPath(e, key) from None
+            # ... or if it is a list of a special type
+            elif memberType is not None:
+                if incVal is not None:
+                    members = []
+                    try:
+                        for v in incVal:
+                            members.append(memberType(v, recognizedMembers))
+                    except (TypeError, ValueError) as e:
+                        raise _WithJsonPath(e, f'{key}[{len(members)}]') from None
+                    self.__setattr__(incProp, members)
+            # finally, plain values get assigned as they are...
+            else:
+                self.__setattr__(incProp, incVal)
 
-        # make sure all required keys are supplied
-        for incProp in myProps:
-            missingProps = []
-            try:
-                check_type(None, myTypes[incProp])
-                isNullable = True
-            except TypeCheckError:
-                isNullable = False
-            if not isNullable and self.__getattribute__(incProp) is None:
-                missingProps.append(incProp)
-        if missingProps:
-            missingStr = ', '.join([f'"{p}"' for p in missingProps])
-            raise TypeError(f'Incoming JSON missing required key{"s" if len(missingProps) > 1 else ""}: {missingStr}')
-
-    def StoreInDb(self, dbConnection: sqlite3.Connection, parentId: int | None = None) -> int:
-        raise NotImplementedError(f'{type(self)} has not implemented a direct-to-database storage method.  Either this class is meant to only be loaded by a class containing it as a member, or the `StoreInDb()` method needs to be implemented.')
+        # ...and checked against their type hints (and for required keys) all at once
+        stats = _instrumented.stats
+        if stats is None:
+            valid = plan.valid(self)
+        else:
+            start = time.perf_counter()
+            valid = plan.valid(self)
+            stats._Nested('validate', time.perf_counter() - start)
+        if not valid:
+            raise plan.Invalid(self, jsonDict)
+
+    def __getattr__(self, name: str) -> any:
+        # only reached for properties that were never set, which on objects read back from a map means relations
+        #   that haven't been loaded yet
+        readBack = _readBack.get(self) if not name.startswith('_') else None
+        if readBack is None:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        session, rowid = readBack
+        return session._LoadRelation(self, rowid, name)
+
+    @classmethod
+    def _Plan(cls, recognizedMembers: Iterable[Type['MapObject']]) -> _HydrationPlan:
+        key = (cls, frozenset(recognizedMembers))
+        try:
+            return MapObject._hydrationPlans[key]
+        except KeyError:
+            plan = MapObject._hydrationPlans[key] = _HydrationPlan(cls, recognizedMembers)
+            return plan
+
+    def StoreInDb(self, dbConnection: sqlite3.Connection, *parentIds: int) -> int:
+        """Stores this object (and its members) on its own and commits.  Imports should use `StoreInBatch()` instead."""
+        batch = ImportBatch(dbConnection)
+        try:
+            parentId = parentIds[0] if parentIds else None
+            id = self.StoreInBatch(batch, parentId, _ParentRow(dbConnection, type(self), parentId))
+            batch.Flush()
+            dbConnection.commit()
+        except:
+            dbConnection.rollback()
+            raise
+        return id
+
+    def StoreInBatch(self, batch: ImportBatch, parentId: int | None = None, parentRow: dict[str, any] | None = None) -> int:
+        """
+        Queues this object's row, and then its members' rows, in `batch`.  `parentId` is the rowid of the object it
+        is stored under; `parentRow` that object's stored values by column, for references keyed on them.
+        """
+        cls = type(self)
+        plan = _TablePlan._plans.get(cls) or _TablePlan.For(cls)
+        values = [getattr(self, prop) for prop in plan.props]
+        if plan.parentColumn is not None:
+            values.append(parentId)
+        for prop, _, refType, refTable, keyColumns in plan.references:
+            value = getattr(self, prop)
+            if len(keyColumns) > 1:
+                if parentRow is None:
+                    raise ValueError(f'{cls.__name__} needs the row of the {plan.parentColumn} it is stored under to look up its {prop}.')
+                key = (*(parentRow[c] for c in keyColumns[:-1]), value)
+            else:
+                key = (value,)
+            refId = batch.Lookup(refTable, keyColumns, key)
+            if refId is None and value is not None:
+                raise _MissingReference(self, batch, plan, refType, keyColumns, key)
+            values.append(refId)
+        extraJson = self.extraJson
+        values.append(json.dumps(extraJson) if extraJson else '{}')
+        rowid = batch.Insert(plan.table, plan.columns, tuple(values))
+        if plan.members:
+            row = dict(zip(plan.columns, values))
+            for prop, isList, jsonKey in plan.members:
+                members = getattr(self, prop)
+                if members is None:
+                    continue
+                for i, member in enumerate(members if isList else (members,)):
+                    try:
+                        member.StoreInBatch(batch, rowid, row)
+                    except (TypeError, ValueError) as e:
+                        raise _WithJsonPath(e, f'{jsonKey}[{i}]' if isList else jsonKey) from None
+        return rowid
 
     @classmethod
     def SetupDbTable(cls, dbConnection: sqlite3.Connection) -> None:
-        raise NotImplementedError(f'{cls} is missing `SetupDbTable()` implementation.')
+        """Creates the object's table (and its foreign key indexes) as laid out by its type hints."""
+        plan = _TablePlan.For(cls)
+        cursor = dbConnection.cursor()
+        cursor.execute(plan.ddl)
+        for index in plan.indexes:
+            cursor.execute(index)
+        dbConnection.commit()
+        cursor.close()
     
+    @classmethod
+    def TableName(cls) -> str:
+        raise NotImplementedError(f'{cls} is missing `TableName()` implementation.')
+
+    @classmethod
+    def KeyColumns(cls) -> tuple[str, ...]:
+        """Columns that identify a row when diffing an import against an existing map (i.e. its natural key)."""
+        raise NotImplementedError(f'{cls} is missing `KeyColumns()` implementation.')
+
+    @classmethod
+    def ReadColumns(cls) -> dict[str, str]:
+        """
+        SQL expressions over the object's table that read each plain property back, for `MapSession`: the column
+        itself, or for references the referenced row's last key column.  Relations to child objects aren't listed;
+        they're found from the children's `Parent()`.
+        """
+        plan = _TablePlan.For(cls)
+        columns = {prop: column for prop, column in plan.values}
+        for prop, column, _, refTable, keyColumns in plan.references:
+            columns[prop] = f'(SELECT {keyColumns[-1]} FROM {refTable} WHERE {refTable}.rowid = {plan.table}.{column})'
+        return {prop: columns[prop] for prop in get_type_hints(cls) if prop in columns}
+
+    @classmethod
+    def ColumnNames(cls) -> dict[str, str]:
+        """Columns that properties are stored in, for the ones not stored under their own name."""
+        return {}
+
+    @classmethod
+    def References(cls) -> dict[str, tuple[Type['MapObject'], tuple[str, ...]]]:
+        """
+        Properties naming another (non-parent) object, stored as a foreign key to it: property -> (type, key columns
+        it is looked up by).  The property supplies the last key column; any before it are taken from the parent's
+        row, e.g. a net named within the bus of the connection a pin belongs to.
+        """
+        return {}
+
+    @classmethod
+    def SearchColumns(cls) -> tuple[str, ...]:
+        """Columns that `SystemMap.Search()` matches against (along with `extraJson`); none leaves the object out."""
+        return ()
+
+    @classmethod
+    def Unique(cls) -> bool:
+        """Whether `KeyColumns()` identify a single row, enforced with a UNIQUE constraint."""
+        return False
+
+    @classmethod
+    def ExportKeys(cls) -> dict[str, str]:
+        """JSON keys that properties are exported under, for the ones that weren't imported under their own name."""
+        return {}
+
+    @classmethod
+    def Parent(cls) -> tuple[str, Type['MapObject']] | None:
+        """The foreign key column pointing at the object this one is stored under, and that object's type."""
+        return None
+
     @classmethod
     def JsonKey(cls) -> str:
         raise NotImplementedError(f'{cls} is missing `JsonKey()` override required to be used as a top-level JSON key.')
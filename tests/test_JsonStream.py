@@ -0,0 +1,39 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import JsonStream
+
+class TopLevelReaderTest(unittest.TestCase):
+
+    DOCUMENT = '{"a": [1.5e10, 2, -0.25, {"x": [true, null]}, "s\\u00e9"], "skipped": 3.25, "b": [], "c": [12345678901234567890]}'
+
+    def Read(self, text: str, chunkSize: int) -> dict[str, list]:
+        reader = JsonStream.TopLevelReader(io.BytesIO(text.encode()), chunkSize)
+        return {key: list(reader.Elements()) for key in reader.Keys() if key != 'skipped'}
+
+    def test_chunk_sizes(self):
+        # every chunk size splits the numbers, strings and literals somewhere different
+        expected = {'a': [1.5e10, 2, -0.25, {'x': [True, None]}, 'sé'], 'b': [], 'c': [12345678901234567890]}
+        for chunkSize in range(1, len(self.DOCUMENT) + 2):
+            with self.subTest(chunkSize=chunkSize):
+                self.assertEqual(self.Read(self.DOCUMENT, chunkSize), expected)
+
+    def test_numbers_at_end_of_buffer(self):
+        for chunkSize in range(1, 40):
+            with self.subTest(chunkSize=chunkSize):
+                reader = JsonStream.TopLevelReader(io.BytesIO(b'{"a": [1.5e10, 2], "b": 3.25}'), chunkSize)
+                self.assertEqual([(key, list(reader.Elements()) if reader.IsArray() else None) for key in reader.Keys()],
+                                 [('a', [1.5e10, 2]), ('b', None)])
+
+    def test_malformed(self):
+        for text in ('{"a": [1 2]}', '{"a": [1,]}', '{"a" [1]}', '{"a": [1]'):
+            for chunkSize in (1, 3, 1 << 16):
+                with self.subTest(text=text, chunkSize=chunkSize), self.assertRaises(ValueError):
+                    self.Read(text, chunkSize)
+
+if __name__ == '__main__':
+    unittest.main()